@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+
+# Archive of the pages get.py fetches, to extract the products from them
+# again (e.g. after changing the rules of get.py or extract.py) offline
+#
+# WARC-style, one file of records and an index next to it:
+# * <archive>: records, appended, each its own gzip member (so it can be read
+#   by itself, from its offset): WARC headers, then the page
+# * <archive>.idx: JSON lines, appended, e.g. {"url": <url>, "digest": <sha256
+#   of the page>, "offset": <of its record>, "length": <of its record>}.
+#   The last line of a URL is its current page
+# Content-addressed: a page is stored once, however many URLs (or runs)
+# it's fetched for, a URL whose page didn't change isn't added again.
+# Records are written before their index line, so an interrupted write
+# leaves at worst a record that isn't indexed (or a cut line, ignored).
+
+# Usage: python archive.py <archive> (lists its pages)
+
+
+class PageArchive:
+    # Thread-safe, and can be sent to other processes (see __getstate__())
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.index_filename = f"{filename}.idx"
+        # { <url>: <digest> }, { <digest>: (<offset>, <length>) }
+        self._urls = {}
+        self._records = {}
+        self._load_index()
+        self._open()
+
+    def _load_index(self) -> None:
+        try:
+            size = os.path.getsize(self.filename)
+            with open(self.index_filename, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry["offset"] + entry["length"] > size:
+                        continue
+                    self._urls[entry["url"]] = entry["digest"]
+                    self._records[entry["digest"]] = (
+                        entry["offset"],
+                        entry["length"],
+                    )
+        except OSError:
+            pass
+
+    def _open(self) -> None:
+        self._lock = threading.Lock()
+        self._file = open(self.filename, "a+b")
+        self._index = open(self.index_filename, "a+")
+        # (End a line cut by an interruption, not to append to it)
+        if self._index.tell():
+            self._index.seek(self._index.tell() - 1)
+            if self._index.read(1) != "\n":
+                self._index.write("\n")
+
+    def __getstate__(self) -> Dict:
+        # (Files and lock are opened again, see __setstate__())
+        state = self.__dict__.copy()
+        for attribute in ("_lock", "_file", "_index"):
+            del state[attribute]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self._open()
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._urls
+
+    def urls(self) -> Dict[str, str]:
+        # { <url>: <digest of its page> }
+        return dict(self._urls)
+
+    def put(self, url: str, text: str) -> None:
+        # Archive the page at a URL (if it changed)
+        content = text.encode("utf-8")
+        digest = hashlib.sha256(content).hexdigest()
+
+        with self._lock:
+            if self._urls.get(url) == digest:
+                return
+
+            record = self._records.get(digest)
+            if record is None:
+                self._file.seek(0, os.SEEK_END)
+                offset = self._file.tell()
+                data = _compress(_record(url, digest, content))
+                self._file.write(data)
+                self._file.flush()
+                record = self._records[digest] = (offset, len(data))
+
+            offset, length = record
+            entry = {"url": url, "digest": digest, "offset": offset, "length": length}
+            self._index.write(json.dumps(entry) + "\n")
+            self._index.flush()
+            self._urls[url] = digest
+
+    def get(self, url: str) -> Optional[str]:
+        # Page archived for a URL, None if there's none
+        digest = self._urls.get(url)
+        if digest is None:
+            return None
+        offset, length = self._records[digest]
+
+        # (Not from the file's position: it can be shared with other threads,
+        # or processes forked with it)
+        data = os.pread(self._file.fileno(), length, offset)
+        _, content = _parse(zlib.decompress(data, wbits=31))
+        return content.decode("utf-8")
+
+    def close(self) -> None:
+        self._file.close()
+        self._index.close()
+
+
+def _record(url: str, digest: str, content: bytes) -> bytes:
+    headers = [
+        "WARC/1.1",
+        "WARC-Type: resource",
+        f"WARC-Record-ID: <urn:sha256:{digest}>",
+        f"WARC-Target-URI: {url}",
+        f"WARC-Date: {time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}",
+        f"WARC-Block-Digest: sha256:{digest}",
+        "Content-Type: text/html; charset=utf-8",
+        f"Content-Length: {len(content)}",
+    ]
+    return "\r\n".join(headers).encode("utf-8") + b"\r\n\r\n" + content + b"\r\n\r\n"
+
+
+def _compress(data: bytes) -> bytes:
+    # A gzip member
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _parse(record: bytes) -> Tuple[Dict[str, str], bytes]:
+    # Headers and content of a record
+    head, _, rest = record.partition(b"\r\n\r\n")
+    headers = dict(
+        line.split(": ", 1) for line in head.decode("utf-8").split("\r\n")[1:]
+    )
+    return headers, rest[: int(headers["Content-Length"])]
+
+
+class ArchiveFetcher:
+    # Same as fetch.Fetcher, from the pages of an archive (no network)
+    # Pages that aren't in it are empty, as a page that failed to load (i.e.
+    # a partial archive gives empty products, see extract.py)
+
+    def __init__(self, archive: PageArchive):
+        self.archive = archive
+
+    def get(self, url: str) -> str:
+        text, _ = self.fetch(url)
+        return text
+
+    def is_modified(self, url: str) -> bool:
+        return True
+
+    def fetch(self, url: str) -> Tuple[str, bool]:
+        text = self.archive.get(url)
+        if text is None:
+            print(f"    Not in the archive: {url}")
+            return "", True
+        return text, True
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python archive.py <archive>")
+
+    archive = PageArchive(sys.argv[1])
+    for url, digest in archive.urls().items():
+        print(f"{digest[:12]} {url}")
+    pages = len(set(archive.urls().values()))
+    print(
+        f"{len(archive)} URLs, {pages} pages, "
+        f"{os.path.getsize(archive.filename) / 1024:.0f} KB"
+    )
@@ -0,0 +1,47 @@
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import get
+from archive import ArchiveFetcher, PageArchive
+
+# Time of get.py --offline, i.e. extracting the products from the pages of an
+# archive (see archive.py), in threads vs. processes, with 1 to (CPUs) workers
+# Extraction is pure CPU (lxml, Python), so only processes use more than one.
+# Its output (get.py's progress) isn't printed.
+
+# Usage: python bench/bench_archive.py [<archive> (default: .get_archive.warc.gz)]
+#   [<docs site URL the archive is of> (default: https://docs.aws.amazon.com)]
+
+
+def extract_all(fetcher, url, workers, processes):
+    # (time (s), products)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        items = get.get_docs_items(fetcher, url, workers, processes=processes)
+    return time.perf_counter() - start, len(items)
+
+
+if __name__ == "__main__":
+    filename = sys.argv[1] if len(sys.argv) > 1 else ".get_archive.warc.gz"
+    url = sys.argv[2] if len(sys.argv) > 2 else get.DOCS_URL
+
+    archive = PageArchive(filename)
+    fetcher = ArchiveFetcher(archive)
+    cpus = os.cpu_count()
+    print(f"{filename}: {len(archive)} URLs, {cpus} CPUs")
+
+    workers = 1
+    while True:
+        for processes in (False, True):
+            elapsed, products = extract_all(fetcher, url, workers, processes)
+            print(
+                f"  {workers} {'processes' if processes else 'threads'}: "
+                f"{elapsed:.2f}s, {products} products"
+            )
+        if workers >= cpus:
+            break
+        workers = min(workers * 2, cpus)
@@ -0,0 +1,88 @@
+import gc
+import glob
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import markovify
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+from compact import CompactChain
+from model import load_items
+
+# Memory and sampling throughput of the Markov chain of the descriptions,
+# markovify's Chain vs. CompactChain (see src/compact.py), on the current
+# products file and on all of them (current + archived) merged
+
+# Usage: python bench/bench_chain.py [<products json> ...] [--walks <n>]
+# (default: src/aws.json, then it and _archive/*.json merged)
+
+
+def corpus_sentences(filenames):
+    # Parsed sentences of the blurbs and descriptions, as model.py builds them
+    items = [item for filename in filenames for item in load_items(filename)]
+    corpus = " ".join([i["blurb"] for i in items] + [i["desc"] for i in items])
+    return markovify.Text(corpus, state_size=2).parsed_sentences
+
+
+def retained_bytes(build):
+    # Memory (bytes) still allocated after build(), and its result
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+
+def walks_per_second(chain, walks):
+    # Sentences (random walks from BEGIN) generated per second
+    random.seed(0)
+    start = time.perf_counter()
+    for _ in range(walks):
+        chain.walk()
+    return walks / (time.perf_counter() - start)
+
+
+def bench(title, filenames, walks):
+    sentences = corpus_sentences(filenames)
+
+    dict_size, chain = retained_bytes(lambda: markovify.Chain(sentences, 2))
+    compact_size, compact = retained_bytes(lambda: CompactChain.from_chain(chain))
+
+    dict_rate = walks_per_second(chain, walks)
+    compact_rate = walks_per_second(compact, walks)
+
+    print(
+        f"{title}: {len(sentences)} sentences, {len(chain.model)} states, "
+        f"{len(compact.next_ids)} transitions"
+    )
+    print(
+        f"  memory: markovify {dict_size / 1024 / 1024:.1f} MB, "
+        f"compact {compact_size / 1024 / 1024:.1f} MB "
+        f"({dict_size / compact_size:.1f}x smaller)"
+    )
+    print(
+        f"  sampling: markovify {dict_rate:.0f} sentences/s, "
+        f"compact {compact_rate:.0f} sentences/s ({compact_rate / dict_rate:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    walks = 10000
+    if "--walks" in args:
+        i = args.index("--walks")
+        walks = int(args[i + 1])
+        del args[i : i + 2]
+
+    if args:
+        bench(", ".join(args), args, walks)
+    else:
+        current = os.path.join("src", "aws.json")
+        bench(current, [current], walks)
+        merged = [current] + sorted(glob.glob(os.path.join("_archive", "*.json")))
+        bench("merged", merged, walks)
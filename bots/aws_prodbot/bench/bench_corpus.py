@@ -0,0 +1,89 @@
+import gc
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+import corpus
+
+# Reading the fields model.py uses (name, blurb, desc) from a products file,
+# JSON (parsed at once, into dicts) vs. the binary corpus format (see
+# src/corpus.py, memory-mapped, only those fields decoded): time and memory
+# On the current products file, and all of them (current + archived) merged
+
+# Usage: python bench/bench_corpus.py [<products json> ...] [--runs <n>]
+# (default: src/aws.json, then it and _archive/*.json merged)
+
+FIELDS = ["name", "blurb", "desc"]
+SCHEMA = ["name", "blurb", "abbreviation", "desc"]
+
+
+def read_fields(filename):
+    items = corpus.open_corpus(filename)
+    return [list(items.column(field)) for field in FIELDS]
+
+
+def measure(filename, runs):
+    # (best time (s), memory allocated (bytes)) to read the fields
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        read_fields(filename)
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    read_fields(filename)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def bench(title, filenames, runs):
+    # (Older files have no abbreviations)
+    items = []
+    for filename in filenames:
+        with open(filename) as f:
+            items += [{k: i.get(k) for k in SCHEMA} for i in json.load(f)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_file = os.path.join(tmp_dir, "products.json")
+        corpus_file = os.path.join(tmp_dir, "products.corpus")
+        corpus.save_json(items, json_file)
+        corpus.write_corpus(items, corpus_file)
+
+        json_time, json_peak = measure(json_file, runs)
+        corpus_time, corpus_peak = measure(corpus_file, runs)
+
+        print(
+            f"{title}: {len(items)} products, JSON {os.path.getsize(json_file) / 1024:.0f} KB, "
+            f"corpus {os.path.getsize(corpus_file) / 1024:.0f} KB"
+        )
+        print(
+            f"  time: JSON {json_time * 1000:.2f}ms, corpus {corpus_time * 1000:.2f}ms "
+            f"({json_time / corpus_time:.1f}x)"
+        )
+        print(
+            f"  peak memory: JSON {json_peak / 1024:.0f} KB, "
+            f"corpus {corpus_peak / 1024:.0f} KB ({json_peak / corpus_peak:.1f}x less)"
+        )
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    runs = 20
+    if "--runs" in args:
+        i = args.index("--runs")
+        runs = int(args[i + 1])
+        del args[i : i + 2]
+
+    if args:
+        bench(", ".join(args), args, runs)
+    else:
+        current = os.path.join("src", "aws.json")
+        bench(current, [current], runs)
+        merged = [current] + sorted(glob.glob(os.path.join("_archive", "*.json")))
+        bench("merged", merged, runs)
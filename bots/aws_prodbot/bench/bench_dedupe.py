@@ -0,0 +1,68 @@
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+import dedupe
+from model import load_items
+
+# Near-duplicate checks (see src/dedupe.py) as the history of posts grows:
+# time to check a new post (name and description) against it, to add one,
+# and to load the history file on start (and its peak memory, traced apart).
+# Posts are random words of the corpus.
+
+# Usage: python bench/bench_dedupe.py [<products json> (default: src/aws.json)] [<max posts>]
+
+
+def random_post(words, rng):
+    name = " ".join(rng.choices(words, k=rng.randint(2, 5)))
+    desc = " ".join(rng.choices(words, k=rng.randint(20, 60)))
+    return name, desc
+
+
+if __name__ == "__main__":
+    aws_json_file = (
+        sys.argv[1] if len(sys.argv) > 1 else os.path.join("src", "aws.json")
+    )
+    max_posts = int(sys.argv[2]) if len(sys.argv) > 2 else 300000
+
+    items = load_items(aws_json_file)
+    words = [w for i in items for w in (i["blurb"] + " " + i["desc"]).split()]
+    rng = random.Random(0)
+    checks = [random_post(words, rng) for _ in range(1000)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, "history.idx")
+        index = dedupe.PostIndex(filename)
+
+        sizes = [s for s in (1000, 10000, 100000) if s < max_posts] + [max_posts]
+        for size in sizes:
+            start = time.perf_counter()
+            added = size - len(index)
+            for _ in range(added):
+                index.add(*random_post(words, rng))
+            add_ms = (time.perf_counter() - start) * 1000 / added
+
+            start = time.perf_counter()
+            for name, desc in checks:
+                index.check(name, desc)
+            check_ms = (time.perf_counter() - start) * 1000 / len(checks)
+
+            start = time.perf_counter()
+            dedupe.PostIndex(filename)
+            load_s = time.perf_counter() - start
+
+            tracemalloc.start()
+            loaded = dedupe.PostIndex(filename)
+            _, load_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del loaded
+
+            print(
+                f"{size:>7} posts: check {check_ms:.3f}ms, add {add_ms:.3f}ms, "
+                f"load {load_s:.2f}s ({os.path.getsize(filename) / 1024 / 1024:.1f} MB, "
+                f"peak {load_peak / 1024 / 1024:.1f} MB)"
+            )
@@ -0,0 +1,108 @@
+import glob
+import os
+import sys
+import time
+from urllib.parse import unquote
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import extract
+
+# Per-page CPU time of get.py's extraction, BeautifulSoup (as get.py used to
+# do it) vs. extract.py, on saved pages, e.g. the ones in get.py's HTTP cache
+
+# Usage: python bench/bench_extract.py [<pages dir> (default: .get_cache)] [<runs>]
+
+
+def soup_landing_page(page):
+    # Landing page, the BeautifulSoup way
+    soup = BeautifulSoup(page, "html.parser")
+    xml = unquote(soup.select("#landing-page-xml")[0]["value"])
+    service_soup = BeautifulSoup(xml, "lxml")
+    landing_page = service_soup.find("landing-page")
+    if landing_page is None:
+        # e.g. the docs main page
+        return None
+    first_href = None
+    for sh in service_soup.find_all("simple-card"):
+        if sh.get("href") is not None:
+            first_href = sh["href"]
+            break
+    return {
+        "title": landing_page.title.string if landing_page.title else None,
+        "titleabbrev": (
+            landing_page.titleabbrev.string if landing_page.titleabbrev else None
+        ),
+        "abstract": landing_page.abstract.string if landing_page.abstract else None,
+        "first_href": first_href,
+    }
+
+
+def lxml_landing_page(page):
+    return extract.landing_page(extract.landing_page_xml(page))
+
+
+def soup_guide_page(page):
+    # Guide page, the BeautifulSoup way
+    soup = BeautifulSoup(page, "html.parser")
+    meta_refresh = soup.find("meta", attrs={"http-equiv": "refresh"})
+    if meta_refresh:
+        return {"meta_refresh": meta_refresh["content"], "paragraph": None, "terms": []}
+    paragraph = None
+    for p in soup.find_all("p"):
+        clean_p = " ".join(p.text.split())
+        if len(clean_p) >= 100:
+            paragraph = clean_p
+            break
+    terms = [dt.text for dt in soup.find_all("dt")]
+    return {"meta_refresh": None, "paragraph": paragraph, "terms": terms}
+
+
+def lxml_guide_page(page):
+    return extract.guide_page(page)
+
+
+def cpu_time(func, page, runs):
+    # Mean CPU time (s) of func(page), and its result
+    start = time.process_time()
+    for _ in range(runs):
+        result = func(page)
+    return (time.process_time() - start) / runs, result
+
+
+if __name__ == "__main__":
+    pages_dir = sys.argv[1] if len(sys.argv) > 1 else ".get_cache"
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    totals = {}
+    mismatches = 0
+    files = sorted(glob.glob(os.path.join(pages_dir, "*.html")))
+
+    for filename in files:
+        with open(filename, "r", encoding="utf-8") as f:
+            page = f.read()
+
+        if "landing-page-xml" in page:
+            kind, funcs = "landing", (soup_landing_page, lxml_landing_page)
+        else:
+            kind, funcs = "guide", (soup_guide_page, lxml_guide_page)
+
+        soup_time, soup_result = cpu_time(funcs[0], page, runs)
+        lxml_time, lxml_result = cpu_time(funcs[1], page, runs)
+
+        if soup_result != lxml_result:
+            mismatches += 1
+            print(f"Different results for {filename}")
+
+        count, soup_total, lxml_total = totals.get(kind, (0, 0, 0))
+        totals[kind] = (count + 1, soup_total + soup_time, lxml_total + lxml_time)
+
+    print(f"{len(files)} pages, {runs} runs each, {mismatches} different result(s)")
+    for kind, (count, soup_total, lxml_total) in totals.items():
+        print(
+            f"{kind:>8} pages ({count}): "
+            f"BeautifulSoup {soup_total / count * 1000:.2f} ms/page, "
+            f"extract.py {lxml_total / count * 1000:.2f} ms/page "
+            f"({soup_total / lxml_total:.1f}x)"
+        )
@@ -0,0 +1,61 @@
+import logging
+import os
+import sys
+import time
+
+os.environ.setdefault("DISABLE_TOOT", "1")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+import model
+import tweet
+
+# Names generated per second by tweet.service_name(), from the name grammar
+# precomputed per corpus (see model.name_grammar()) vs. rebuilding it for
+# every name, as it used to be (regex passes over the existing names,
+# prefix/suffix frequencies, filtering of the nouns and verbs)
+# And by tweet.service_names(), NAME_BATCH names at a time, as generate() does
+
+# Usage: python bench/bench_names.py [<products json> (default: src/aws.json)] [<names>]
+
+
+def names_per_second(func, names):
+    start = time.perf_counter()
+    for _ in range(names):
+        func()
+    return names / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    aws_json_file = (
+        sys.argv[1] if len(sys.argv) > 1 else os.path.join("src", "aws.json")
+    )
+    names = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    # Not the debug logs of every name
+    logging.getLogger("root").setLevel(logging.WARNING)
+
+    m = model.get_model(aws_json_file)
+
+    def rebuilt():
+        prefix_fdist, suffix_fdist = model.name_fdists(m.names)
+        grammar = model.name_grammar(prefix_fdist, suffix_fdist, m.tags_dict)
+        return tweet.service_name(grammar)
+
+    def precomputed():
+        return tweet.service_name(m.name_grammar)
+
+    def batched():
+        return tweet.service_names(m.name_grammar, tweet.NAME_BATCH)
+
+    before = names_per_second(rebuilt, names)
+    after = names_per_second(precomputed, names)
+    batched_rate = names_per_second(batched, names // tweet.NAME_BATCH) * (
+        tweet.NAME_BATCH
+    )
+
+    print(f"{aws_json_file}, {names} names")
+    print(f"  grammar rebuilt per name: {before:.0f} names/s")
+    print(f"  grammar precomputed: {after:.0f} names/s ({after / before:.0f}x)")
+    print(
+        f"  batched, {tweet.NAME_BATCH} at a time: {batched_rate:.0f} names/s "
+        f"({batched_rate / after:.1f}x)"
+    )
@@ -0,0 +1,118 @@
+import gc
+import glob
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+import markovify
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+import model
+from compact import CompactChain
+from model import load_items
+
+# Build time and memory of the descriptions' text model: of words (plain
+# markovify.Text, as model.py builds it) vs. of words and their tags (see
+# POSifiedText in src/chain.py), built from the tags nltk_tags() already has
+# vs. tagging every sentence again (as tweet.py's POSifiedText did)
+# Tagging the texts (nltk_tags(), done once for both) isn't counted.
+# On the current products file, and all of them (current + archived) merged
+
+# Usage: python bench/bench_pos.py [<products json> ...] [--runs <n>] [--no-retag]
+# (default: src/aws.json, then it and _archive/*.json merged)
+
+
+class RetaggingText(markovify.Text):
+    # The former POSifiedText: tags every sentence while building the chain
+    def word_split(self, sentence):
+        import nltk
+
+        words = re.split(self.word_split_pattern, sentence)
+        return ["::".join(tag) for tag in nltk.pos_tag(words)]
+
+    def word_join(self, words):
+        return " ".join(word.split("::")[0] for word in words)
+
+
+def measure(build, runs):
+    # (best time (s), memory still allocated (bytes)) of build(), and its result
+    # (timed without tracemalloc, which slows it down)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        build()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), size, result
+
+
+def words_model(texts):
+    parser = model.sentence_parser(2)
+    sentences = list(parser.generate_corpus(texts))
+    text_model = markovify.Text(None, state_size=2, parsed_sentences=sentences)
+    text_model.chain = CompactChain.from_chain(text_model.chain)
+    return text_model
+
+
+def retagged_model(texts):
+    text_model = RetaggingText(texts, state_size=2)
+    text_model.chain = CompactChain.from_chain(text_model.chain)
+    return text_model
+
+
+def print_result(title, elapsed, size, text_model):
+    print(
+        f"  {title}: {elapsed:.2f}s, {size / 1024 / 1024:.1f} MB, "
+        f"{len(text_model.chain.states)} states, {len(text_model.chain.words)} words"
+    )
+
+
+def bench(title, filenames, retag, runs):
+    items = [item for filename in filenames for item in load_items(filename)]
+    texts = [i["blurb"] for i in items] + [i["desc"] for i in items]
+
+    start = time.perf_counter()
+    tags_cache = {model.text_key(text): model.nltk_tags(text) for text in texts}
+    print(
+        f"{title}: {len(texts)} texts, tagged in {time.perf_counter() - start:.2f}s "
+        f"(not counted)"
+    )
+
+    elapsed, size, text_model = measure(lambda: words_model(texts), runs)
+    print_result("words", elapsed, size, text_model)
+
+    # (Its corpus text is text_model's, not counted again)
+    elapsed, size, pos_model = measure(
+        lambda: model.pos_text_model(texts, tags_cache, text_model), runs
+    )
+    print_result("words and tags, from the tags", elapsed, size, pos_model)
+
+    if retag:
+        elapsed, size, retagged = measure(lambda: retagged_model(texts), runs)
+        print_result("words and tags, tagging again", elapsed, size, retagged)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    runs = 3
+    if "--runs" in args:
+        i = args.index("--runs")
+        runs = int(args[i + 1])
+        del args[i : i + 2]
+    retag = "--no-retag" not in args
+    args = [a for a in args if a != "--no-retag"]
+
+    if args:
+        bench(", ".join(args), args, retag, runs)
+    else:
+        current = os.path.join("src", "aws.json")
+        bench(current, [current], retag, runs)
+        merged = [current] + sorted(glob.glob(os.path.join("_archive", "*.json")))
+        bench("merged", merged, retag, runs)
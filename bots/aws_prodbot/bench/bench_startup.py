@@ -0,0 +1,105 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+# Startup time of app.py, per STARTUP_MODE (see app.py):
+# * import: time to import app.py, in a new process
+# * cold start: from starting a new server process until /healthz answers,
+#   then until /readyz does (i.e. it can serve)
+# Run the app as configured by the environment, e.g. with a prebuilt model:
+# AWS_PRODUCTS_FILE=aws.json AWS_MODEL_FILE=aws.model (defaults, from src/)
+
+# Usage: python bench/bench_startup.py [<runs>]
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+IMPORT_CODE = """
+import time
+start = time.perf_counter()
+import app
+print(time.perf_counter() - start)
+"""
+
+SERVER_CODE = """
+import logging, sys
+import app
+logging.getLogger("werkzeug").setLevel(logging.ERROR)
+app.app.run(port=int(sys.argv[1]))
+"""
+
+
+def app_env(startup_mode):
+    env = dict(os.environ, STARTUP_MODE=startup_mode)
+    env.setdefault("AWS_PRODUCTS_FILE", "aws.json")
+    env.setdefault("AWS_MODEL_FILE", "aws.model")
+    env.setdefault("DISABLE_TOOT", "1")
+    return env
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def import_time(startup_mode):
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_CODE],
+        cwd=SRC_DIR,
+        env=app_env(startup_mode),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return float(output.split()[-1])
+
+
+def wait_for(url, start, timeout=300):
+    # Time (s) since 'start' when 'url' first answered 200
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as r:
+                if r.status == 200:
+                    return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(url)
+
+
+def cold_start(startup_mode):
+    # (time to /healthz, time to /readyz)
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-c", SERVER_CODE, str(port)],
+        cwd=SRC_DIR,
+        env=app_env(startup_mode),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        healthy = wait_for(f"http://127.0.0.1:{port}/healthz", start)
+        ready = wait_for(f"http://127.0.0.1:{port}/readyz", start)
+    finally:
+        server.terminate()
+        server.wait()
+    return healthy, ready
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    for startup_mode in ["eager", "background"]:
+        imports = [import_time(startup_mode) for _ in range(runs)]
+        starts = [cold_start(startup_mode) for _ in range(runs)]
+        print(
+            f"{startup_mode:>10}: import {min(imports):.2f}s, "
+            f"/healthz after {min(h for h, _ in starts):.2f}s, "
+            f"/readyz after {min(r for _, r in starts):.2f}s "
+            f"(best of {runs})"
+        )
@@ -0,0 +1,121 @@
+import argparse
+import hashlib
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local fake of the docs site, to run get.py against (--url) without the real
+# one, incl. the pages it has to handle: guide pages behind a meta refresh
+# placeholder, landing pages whose first card links outside the docs (or to
+# nothing), missing guide pages (404) and a section that's skipped. Pages have
+# an ETag (and answer 304), as the HTTP cache and --incremental expect.
+
+# Usage: python bench/fake_docs.py [--port 8766] [--products 20]
+# then e.g. python get.py /tmp/aws.json --url http://127.0.0.1:8766/ --cache ''
+
+
+def page(xml):
+    # A page with its landing page XML, as the docs site has it
+    value = urllib.parse.quote(xml)
+    return f'<html><body><input id="landing-page-xml" value="{value}"/></body></html>'
+
+
+def guide(i):
+    description = " ".join([f"Service {i} lets you do many things with words."] * 3)
+    return (
+        f"<html><head><title>Guide</title></head><body><p>Short.</p>"
+        f"<p>{description}</p><dl><dt>Amazon Extra{i}</dt><dd>Extra</dd>"
+        f"<dt>Svc{i}   Thing</dt><dt>Other</dt></dl></body></html>"
+    )
+
+
+def first_href(i):
+    # Kind of first card of product i (and its guide pages, if any)
+    if i % 5 == 1:
+        # Outside of the docs site
+        return f"https://github.com/aws/svc{i}", {}
+    if i % 5 == 2:
+        # None (the card has no href)
+        return None, {}
+    if i % 5 == 3:
+        # Behind a meta refresh placeholder
+        refresh = '<html><head><meta http-equiv="refresh" content="10;URL=concepts.html"></head></html>'
+        return f"/svc{i}/guide/index.html?id=docs", {
+            f"/svc{i}/guide/index.html": refresh,
+            f"/svc{i}/guide/concepts.html": guide(i),
+        }
+    if i % 5 == 4:
+        # Missing (404)
+        return f"/svc{i}/missing/", {}
+    return f"/svc{i}/guide/", {f"/svc{i}/guide/": guide(i)}
+
+
+def docs_site(products):
+    # { <path>: <page> }
+    services = "".join(
+        f'<service href="/svc{i}/"><prefix>AWS</prefix><name>Svc{i}</name></service>'
+        for i in range(products)
+    )
+    pages = {
+        "/": page(
+            f"<landing-page><list-card><title>Compute</title><list-card-items>"
+            f"{services}</list-card-items></list-card>"
+            f"<list-card><title>General Reference</title><list-card-items>"
+            f'<service href="/gr/"><name>GR</name></service>'
+            f"</list-card-items></list-card></landing-page>"
+        )
+    }
+    for i in range(products):
+        href, guide_pages = first_href(i)
+        card = f' href="{href}"' if href else ""
+        pages[f"/svc{i}/"] = page(
+            f"<landing-page><title>Amazon Service {i} Documentation</title>"
+            f"<titleabbrev>Amazon S{i}</titleabbrev>"
+            f"<abstract>Amazon Service {i} is a   thing\n that does {i}.</abstract>"
+            f'<sections><section id="s{i}"><cards>'
+            f'<simple-card{card} guide="true"><title>User Guide</title></simple-card>'
+            f"</cards></section></sections></landing-page>"
+        )
+        pages.update(guide_pages)
+    return pages
+
+
+class FakeDocsHandler(BaseHTTPRequestHandler):
+    # Set from the command line (see __main__)
+    pages = {}
+
+    def do_GET(self):
+        body = self.pages.get(urllib.parse.urlsplit(self.path).path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        data = body.encode("utf-8")
+        etag = f'"{hashlib.sha256(data).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--products", type=int, default=20)
+    args = parser.parse_args()
+
+    FakeDocsHandler.pages = docs_site(args.products)
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), FakeDocsHandler)
+    print(f"Fake docs site on http://127.0.0.1:{args.port}/", flush=True)
+    server.serve_forever()
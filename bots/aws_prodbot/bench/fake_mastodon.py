@@ -0,0 +1,86 @@
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local fake of the Mastodon API (only posting statuses), to test posting
+# (src/poster.py) without a real instance, incl. its retries: it can be slow
+# and fail randomly. Statuses are deduplicated by idempotency key, like
+# Mastodon does, and only printed.
+
+# Usage: python bench/fake_mastodon.py [--port 8765] [--fail-rate 0.5] [--delay 1]
+# then e.g. MASTODON_API_URL=http://localhost:8765 MASTODON_ACCESS_TOKEN=x
+
+
+class FakeMastodonHandler(BaseHTTPRequestHandler):
+    # Set from the command line (see __main__)
+    fail_rate = 0
+    delay = 0
+    statuses = {}
+    lock = threading.Lock()
+
+    def _send_json(self, code, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if urllib.parse.urlsplit(self.path).path != "/api/v1/statuses":
+            self._send_json(404, {"error": "Record not found"})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("utf-8")
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            params = json.loads(body or "{}")
+        else:
+            params = dict(urllib.parse.parse_qsl(body))
+
+        time.sleep(self.delay)
+        if random.random() < self.fail_rate:
+            self._send_json(503, {"error": "Service Unavailable"})
+            return
+
+        key = self.headers.get("Idempotency-Key") or object()
+        with self.lock:
+            status = self.statuses.get(key)
+            if status is None:
+                status = {
+                    "id": str(len(self.statuses) + 1),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "content": params.get("status", ""),
+                    "visibility": "public",
+                }
+                self.statuses[key] = status
+                print(f"Status #{status['id']}: {status['content']!r}", flush=True)
+            else:
+                print(f"Status #{status['id']} posted again (same key)", flush=True)
+
+        self._send_json(200, status)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--fail-rate", type=float, default=0, help="share of requests failing (503)"
+    )
+    parser.add_argument("--delay", type=float, default=0, help="response time (s)")
+    args = parser.parse_args()
+
+    FakeMastodonHandler.fail_rate = args.fail_rate
+    FakeMastodonHandler.delay = args.delay
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), FakeMastodonHandler)
+    print(f"Fake Mastodon API on http://127.0.0.1:{args.port}", flush=True)
+    server.serve_forever()
@@ -0,0 +1,190 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import time
+
+os.environ.setdefault("DISABLE_TOOT", "1")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+import model
+import tweet
+
+# Regression harness: generates the same (seeded) set of posts from a products
+# file every run, and records:
+# * latency percentiles per stage: load (the model), tag (one text, with
+#   nltk), name, desc (one post's), post (formatting and queuing one toot)
+# * attempts (start expressions tried) per description
+# * peak memory (max RSS)
+# * a hash of the posts generated, to tell if they changed
+# * posts over tweet.MAX_LEN (always a regression: descriptions are generated
+#   under it)
+# then compares them against a stored baseline (--save to store one)
+# Posts are only queued, not sent, unless DISABLE_TOOT is set to '' (see tweet.py)
+
+# Usage: python bench/harness.py [<products json> (default: src/aws.json)]
+#   [--model <file.model>] [-n 100] [--seed 0] [--mode words]
+#   [--baseline bench/baseline.json] [--save] [--tolerance 0.2]
+
+PERCENTILES = [50, 95, 99]
+
+# Latency differences (ms) smaller than this are noise, whatever the tolerance
+NOISE_MS = 1
+
+
+def percentiles(values):
+    # {"p50": ..., "p95": ..., "p99": ...} (nearest rank)
+    values = sorted(values)
+    return {
+        f"p{p}": values[min(len(values) - 1, len(values) * p // 100)]
+        for p in PERCENTILES
+    }
+
+
+def timed(func, *args):
+    # (result, time (s)) of func(*args)
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def run(aws_json_file, model_file, n, seed, mode="words"):
+    stages = {"load": [], "tag": [], "name": [], "desc": [], "post": []}
+
+    m, load_s = timed(model.get_model, aws_json_file, model_file)
+    stages["load"].append(load_s)
+
+    # Tagging, on the first <n> texts of the corpus
+    items = model.load_items(aws_json_file)
+    texts = [i["blurb"] for i in items] + [i["desc"] for i in items]
+    for text in texts[:n]:
+        stages["tag"].append(timed(model.nltk_tags, text)[1])
+
+    stats = []
+    posts = []
+    for product in tweet.generate(m, n, random.Random(seed), stats, mode):
+        intro, intro_s = timed(tweet.toot_intro, product["name"], product["abbrev"])
+        post = f"{intro} {product['desc']}"
+        stages["post"].append(intro_s + timed(tweet.send_toot, post)[1])
+        posts.append(post)
+    stages["name"] = [s["name_s"] for s in stats]
+    stages["desc"] = [s["desc_s"] for s in stats]
+    attempts = [s["attempts"] for s in stats]
+
+    # Max RSS is in KB on Linux (bytes on macOS)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_kb //= 1024
+
+    return {
+        "products": os.path.basename(aws_json_file),
+        "n": n,
+        "seed": seed,
+        "mode": mode,
+        "too_long": sum(len(post) > tweet.MAX_LEN for post in posts),
+        "posts_sha256": hashlib.sha256("\n".join(posts).encode("utf-8")).hexdigest(),
+        "stages_ms": {
+            stage: {k: v * 1000 for k, v in percentiles(times).items()}
+            for stage, times in stages.items()
+            if times
+        },
+        "attempts": {"mean": sum(attempts) / len(attempts), "max": max(attempts)},
+        "peak_rss_mb": peak_kb / 1024,
+    }
+
+
+def report(result):
+    print(
+        f"{result['products']}, {result['n']} posts, seed {result['seed']}, "
+        f"{result['mode']} mode (posts {result['posts_sha256'][:12]})"
+    )
+    print(f"  over {tweet.MAX_LEN} chars: {result['too_long']}")
+    for stage, p in result["stages_ms"].items():
+        print(f"  {stage:>5}: " + ", ".join(f"{k} {v:.2f}ms" for k, v in p.items()))
+    a = result["attempts"]
+    print(f"  attempts per description: mean {a['mean']:.2f}, max {a['max']}")
+    print(f"  peak memory: {result['peak_rss_mb']:.0f} MB")
+
+
+def compare(result, baseline, tolerance):
+    # Differences with the baseline worth failing on, as text
+    regressions = []
+    if result["too_long"]:
+        regressions.append(f"{result['too_long']} posts over {tweet.MAX_LEN} chars")
+
+    # (Baselines from before --mode are of the words mode)
+    baseline_run = (baseline["n"], baseline["seed"], baseline.get("mode", "words"))
+    if (result["n"], result["seed"], result["mode"]) != baseline_run:
+        return regressions + [
+            f"baseline is for n={baseline_run[0]}, seed={baseline_run[1]}, "
+            f"mode={baseline_run[2]}"
+        ]
+
+    if result["posts_sha256"] != baseline["posts_sha256"]:
+        regressions.append("posts changed (same seed, different output)")
+
+    for stage, p in result["stages_ms"].items():
+        before = baseline["stages_ms"].get(stage)
+        if not before:
+            continue
+        for k, v in p.items():
+            if v > before[k] * (1 + tolerance) and v - before[k] > NOISE_MS:
+                regressions.append(
+                    f"{stage} {k}: {before[k]:.2f}ms -> {v:.2f}ms "
+                    f"(+{(v / before[k] - 1) * 100:.0f}%)"
+                )
+
+    if result["attempts"]["mean"] > baseline["attempts"]["mean"] * (1 + tolerance):
+        regressions.append(
+            f"attempts per description: {baseline['attempts']['mean']:.2f} -> "
+            f"{result['attempts']['mean']:.2f}"
+        )
+    if result["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        regressions.append(
+            f"peak memory: {baseline['peak_rss_mb']:.0f} MB -> "
+            f"{result['peak_rss_mb']:.0f} MB"
+        )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("filename", nargs="?", default=os.path.join("src", "aws.json"))
+    parser.add_argument("--model", help="prebuilt model (model.py)")
+    parser.add_argument("-n", type=int, default=100, help="posts to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", default="words", choices=tweet.DESC_MODES)
+    parser.add_argument("--baseline", default=os.path.join("bench", "baseline.json"))
+    parser.add_argument(
+        "--save", action="store_true", help="store this run as the baseline"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="slowdown (share) over the baseline that counts as a regression",
+    )
+    args = parser.parse_args()
+
+    # Not the debug logs of every post
+    logging.getLogger("root").setLevel(logging.WARNING)
+
+    result = run(args.filename, args.model, args.n, args.seed, args.mode)
+    report(result)
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressions vs. {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regression vs. {args.baseline}")
@@ -0,0 +1,95 @@
+import argparse
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+
+# Load test of a running app: <concurrency> clients request a URL (e.g.
+# /generate) in a loop for <duration> seconds, while another one checks
+# /healthz. Reports throughput, status codes (429: pool full, see
+# src/pool.py) and latency percentiles, for both.
+# e.g. against the app as it runs in the Docker image:
+# cd src && AWS_PRODUCTS_FILE=aws.json AWS_MODEL_FILE=aws.model DISABLE_TOOT=1 \
+#   gunicorn -c gunicorn.conf.py app:app
+
+# Usage: python bench/load_test.py [--url http://127.0.0.1:8080/generate?n=5]
+#   [--concurrency 16] [--duration 10] [--backoff 0.1 (s, after a 429)]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * p // 100)] if values else 0
+
+
+def request(url, timeout=60):
+    # (status, latency (s))
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as r:
+            r.read()
+            status = r.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = "error"
+    return status, time.perf_counter() - start
+
+
+def client(url, deadline, results, interval=0, backoff=0):
+    # (Backs off after a 429, as a client honouring Retry-After would)
+    while time.perf_counter() < deadline:
+        status, latency = request(url)
+        results.append((status, latency))
+        time.sleep(backoff if status == 429 else interval)
+
+
+def report(title, results, duration):
+    statuses = Counter(status for status, _ in results)
+    ok = [latency for status, latency in results if status == 200]
+    print(
+        f"{title}: {len(ok) / duration:.1f} OK/s, "
+        + ", ".join(
+            f"{status}: {count}" for status, count in sorted(statuses.items(), key=str)
+        )
+    )
+    if ok:
+        print(
+            f"  latency (OK): p50 {percentile(ok, 50) * 1000:.0f}ms, "
+            f"p99 {percentile(ok, 99) * 1000:.0f}ms, max {max(ok) * 1000:.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8080/generate?n=5")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--backoff", type=float, default=0.1)
+    args = parser.parse_args()
+
+    health_url = urllib.parse.urljoin(args.url, "/healthz")
+    deadline = time.perf_counter() + args.duration
+    results = []
+    health_results = []
+
+    threads = [
+        threading.Thread(
+            target=client, args=(args.url, deadline, results, 0, args.backoff)
+        )
+        for _ in range(args.concurrency)
+    ]
+    threads.append(
+        threading.Thread(
+            target=client, args=(health_url, deadline, health_results, 0.05)
+        )
+    )
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"{args.concurrency} clients, {args.duration:.0f}s")
+    report(args.url, results, args.duration)
+    report(health_url, health_results, args.duration)
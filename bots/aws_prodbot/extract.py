@@ -0,0 +1,263 @@
+import re
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+from lxml import etree, html
+
+# Extraction layer of get.py
+# Pulls only what get.py needs out of the docs pages with lxml's parser
+# in "target" mode: the parser calls back for each start tag, text and end
+# tag and no tree (lxml's or BeautifulSoup's) is ever built. Pages are fed in
+# chunks so parsing can stop as soon as everything needed was found.
+
+# Size of the chunks pages are fed to the parser in
+CHUNK_SIZE = 16 * 1024
+
+# The landing page XML is URL-encoded in this <input>'s value
+# e.g. <input id="landing-page-xml" type="hidden" value="%3Clanding-page...">
+LANDING_PAGE_XML_INPUT_RE = re.compile(
+    r"<input\b[^>]*\bid=[\"']?landing-page-xml[\"'\s>][^>]*>", re.I
+)
+
+
+class _Target:
+    # Base parser target: tracks the open tags.
+    # Parsing stops (see _parse()) once 'done' is set
+    def __init__(self):
+        self.open_tags = []
+        self.done = False
+
+    def start(self, tag, attrib):
+        self.open_tags.append(tag)
+
+    def end(self, tag):
+        # Unbalanced end tags are dropped by the parser, pop to the match
+        while self.open_tags:
+            if self.open_tags.pop() == tag:
+                break
+
+    def data(self, data):
+        pass
+
+    def close(self):
+        return self
+
+
+def _parse(target: _Target, text: str) -> _Target:
+    # Feed 'text' to lxml's (forgiving) HTML parser, as BeautifulSoup's "lxml"
+    # would, until the target is done
+    parser = etree.HTMLParser(target=target, recover=True)
+    for i in range(0, len(text), CHUNK_SIZE):
+        parser.feed(text[i : i + CHUNK_SIZE])
+        if target.done:
+            return target
+    try:
+        parser.close()
+    except etree.XMLSyntaxError:
+        # Nothing to parse (e.g. an empty page, or one that failed to load)
+        pass
+    return target
+
+
+def _clean(text: str) -> str:
+    # Remove extra whitespace (incl. newlines)
+    return " ".join(text.split())
+
+
+def landing_page_xml(page: str) -> Optional[str]:
+    # The (decoded) landing page XML of a page, if it has one
+    match = LANDING_PAGE_XML_INPUT_RE.search(page)
+    if match:
+        # Only parse the <input> itself (for its attributes)
+        value = html.fragment_fromstring(match.group(0)).get("value")
+    elif "landing-page-xml" in page:
+        # Unusual markup, parse it all
+        inputs = html.fromstring(page).xpath('//*[@id="landing-page-xml"]')
+        value = inputs[0].get("value") if inputs else None
+    else:
+        value = None
+
+    return unquote(value) if value is not None else None
+
+
+class _StringTarget(_Target):
+    # Collects the text of elements, like BeautifulSoup's Tag.string:
+    # None if they contain other elements (or nothing)
+    def __init__(self):
+        super().__init__()
+        # [tag, text parts, has child elements]
+        self.collecting = []
+
+    def start(self, tag, attrib):
+        super().start(tag, attrib)
+        for c in self.collecting:
+            c[2] = True
+
+    def data(self, data):
+        for c in self.collecting:
+            c[1].append(data)
+
+    def collect(self, tag):
+        self.collecting.append([tag, [], False])
+
+    def collected(self, tag) -> Optional[Tuple[str, Optional[str]]]:
+        # (tag, string) of the element being closed, if it was collected
+        if not self.collecting or self.collecting[-1][0] != tag:
+            return None
+        _, parts, has_children = self.collecting.pop()
+        text = "".join(parts)
+        return tag, (text if text and not has_children else None)
+
+
+class _IndexTarget(_StringTarget):
+    # See docs_index()
+    def __init__(self):
+        super().__init__()
+        self.services = []
+        self.list_card_title = None
+        self.list_card_title_found = False
+        self.service = None
+
+    def start(self, tag, attrib):
+        super().start(tag, attrib)
+        if tag == "list-card":
+            self.list_card_title = None
+            self.list_card_title_found = False
+        elif tag == "title" and not self.list_card_title_found:
+            # First <title> of a list-card
+            if "list-card" in self.open_tags[:-1]:
+                self.list_card_title_found = True
+                self.collect(tag)
+        elif tag == "service":
+            # [section title, href, name]
+            self.service = [self.list_card_title, attrib.get("href"), None]
+        elif tag == "name" and self.service and self.service[2] is None:
+            self.collect(tag)
+
+    def end(self, tag):
+        collected = self.collected(tag)
+        if collected and tag == "title":
+            self.list_card_title = collected[1]
+        elif collected and tag == "name":
+            self.service[2] = collected[1]
+        elif tag == "service" and self.service:
+            self.services.append(tuple(self.service))
+            self.service = None
+        super().end(tag)
+
+
+def docs_index(xml: str) -> List[Tuple[str, str, str]]:
+    # Services of the docs main page XML, in order:
+    # [(<section (list-card) title>, <href>, <name>), ...]
+    return _parse(_IndexTarget(), xml).services
+
+
+class _LandingPageTarget(_StringTarget):
+    # See landing_page()
+    FIELDS = ["title", "titleabbrev", "abstract"]
+
+    def __init__(self):
+        super().__init__()
+        self.found = False
+        self.page = {}
+
+    def start(self, tag, attrib):
+        super().start(tag, attrib)
+        if tag == "landing-page":
+            self.found = True
+        elif "landing-page" not in self.open_tags:
+            return
+        elif tag in self.FIELDS and tag not in self.page:
+            # First of each
+            self.page[tag] = None
+            self.collect(tag)
+        elif tag == "simple-card" and "first_href" not in self.page:
+            # First one with a href
+            if attrib.get("href") is not None:
+                self.page["first_href"] = attrib.get("href")
+
+        self.done = len(self.page) == len(self.FIELDS) + 1 and not self.collecting
+
+    def end(self, tag):
+        collected = self.collected(tag)
+        if collected:
+            self.page[tag] = collected[1]
+        super().end(tag)
+        self.done = len(self.page) == len(self.FIELDS) + 1 and not self.collecting
+
+
+def landing_page(xml: str) -> Optional[Dict]:
+    # What get.py uses of a landing page XML, e.g.
+    # {"title": <title>, "titleabbrev": <abbrev.>, "abstract": <blurb>,
+    #  "first_href": <href of the first simple-card that has one>}
+    # Values are None if missing. None if it's not a landing page.
+    target = _parse(_LandingPageTarget(), xml)
+    if not target.found:
+        return None
+
+    page = {field: None for field in target.FIELDS + ["first_href"]}
+    page.update(target.page)
+    return page
+
+
+class _GuidePageTarget(_Target):
+    # See guide_page()
+    def __init__(self, min_paragraph_len: int, stop_at_refresh: bool):
+        super().__init__()
+        self.min_paragraph_len = min_paragraph_len
+        self.stop_at_refresh = stop_at_refresh
+        self.meta_refresh = None
+        self.paragraph = None
+        self.terms = []
+        # Text parts of the open <p> and <dt>, if any
+        self.p_parts = None
+        self.dt_parts = None
+
+    def start(self, tag, attrib):
+        super().start(tag, attrib)
+        if tag == "meta" and attrib.get("http-equiv") == "refresh":
+            if self.meta_refresh is None:
+                self.meta_refresh = attrib.get("content")
+            # Placeholder page, nothing else matters
+            self.done = self.stop_at_refresh
+        elif tag == "p" and self.paragraph is None:
+            self.p_parts = []
+        elif tag == "dt":
+            self.dt_parts = []
+
+    def data(self, data):
+        if self.p_parts is not None:
+            self.p_parts.append(data)
+        if self.dt_parts is not None:
+            self.dt_parts.append(data)
+
+    def end(self, tag):
+        super().end(tag)
+        if tag == "p" and self.p_parts is not None:
+            paragraph = _clean("".join(self.p_parts))
+            self.p_parts = None
+            if len(paragraph) >= self.min_paragraph_len:
+                self.paragraph = paragraph
+        elif tag == "dt" and self.dt_parts is not None:
+            self.terms.append("".join(self.dt_parts))
+            self.dt_parts = None
+
+
+def guide_page(
+    page: str, min_paragraph_len: int = 100, stop_at_refresh: bool = True
+) -> Dict:
+    # What get.py uses of a guide (HTML) page, e.g.
+    # {"meta_refresh": <content of <meta http-equiv="refresh">> or None,
+    #  "paragraph": <first <p> at least 'min_paragraph_len' long> or None,
+    #  "terms": [<text of <dt>>, ...]}
+    # If the page is a redirect placeholder (meta refresh), only that is set,
+    # unless 'stop_at_refresh' is False.
+    target = _parse(_GuidePageTarget(min_paragraph_len, stop_at_refresh), page)
+    if target.meta_refresh and stop_at_refresh:
+        return {"meta_refresh": target.meta_refresh, "paragraph": None, "terms": []}
+
+    return {
+        "meta_refresh": target.meta_refresh,
+        "paragraph": target.paragraph,
+        "terms": target.terms,
+    }
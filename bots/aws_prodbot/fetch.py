@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+from typing import Dict, Optional, Tuple
+
+from archive import PageArchive
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# HTTP layer of get.py
+# * One pooled, keep-alive session shared by all the fetching threads
+# * A rate limit per host (instead of sleeping between requests)
+# * An on-disk cache, revalidated with ETag/Last-Modified (If-None-Match,
+#   If-Modified-Since) so unchanged pages are not downloaded again
+# * Optionally, an archive of the pages, to extract from again offline
+#   (see archive.py)
+
+
+class RateLimiter:
+    # Allow at most <rate> requests per second per host (evenly spaced)
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str) -> None:
+        if not self.interval:
+            return
+
+        host = urllib.parse.urlsplit(url).netloc
+
+        # Reserve the next slot for this host, then sleep until it
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class HTTPCache:
+    # Pages on disk: <dir>/<sha256 of url>.json (validators) and .html (text)
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, url: str) -> Optional[Dict]:
+        # e.g. {"url": <url>, "etag": <etag>, "last_modified": <date>, "text": <page>}
+        path = self._path(url)
+        try:
+            with open(f"{path}.json", "r") as f:
+                entry = json.load(f)
+            with open(f"{path}.html", "r", encoding="utf-8") as f:
+                entry["text"] = f.read()
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def put(self, url: str, etag: str, last_modified: str, text: str) -> None:
+        path = self._path(url)
+        entry = {"url": url, "etag": etag, "last_modified": last_modified}
+
+        # Write then rename, so a page is never half-written
+        # (text first: the .json is what makes an entry exist)
+        for ext, content in ((".html", text), (".json", json.dumps(entry))):
+            tmp = f"{path}{ext}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp, f"{path}{ext}")
+
+
+class Fetcher:
+    # Thread-safe page fetcher
+
+    def __init__(
+        self,
+        rate: float = 4,
+        pool_size: int = 8,
+        cache_dir: Optional[str] = None,
+        timeout: float = 30,
+        archive: Optional[PageArchive] = None,
+    ):
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(rate)
+        self.cache = HTTPCache(cache_dir) if cache_dir else None
+        self.archive = archive
+
+        # Keep-alive connections (up to 'pool_size' per host)
+        # Retry connection errors and server errors, with backoff
+        retries = Retry(
+            total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504]
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries
+        )
+        self.session = Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url: str) -> str:
+        # Text of the page at <url>
+        text, _ = self.fetch(url)
+        return text
+
+    def is_modified(self, url: str) -> bool:
+        # Whether the page at <url> changed since it was cached
+        # (always True if it isn't)
+        _, modified = self.fetch(url)
+        return modified
+
+    def fetch(self, url: str) -> Tuple[str, bool]:
+        # Text of the page at <url>, and whether it changed since it was cached
+        # (i.e. False only if the server said it wasn't modified)
+        cached = self.cache.get(url) if self.cache else None
+
+        headers = {}
+        if cached:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        self.rate_limiter.wait(url)
+        r = self.session.get(url, headers=headers, timeout=self.timeout)
+
+        if cached and r.status_code == 304:
+            if self.archive is not None:
+                self.archive.put(url, cached["text"])
+            return cached["text"], False
+
+        # Only cache pages that can be revalidated
+        etag = r.headers.get("ETag")
+        last_modified = r.headers.get("Last-Modified")
+        if self.cache and r.ok and (etag or last_modified):
+            self.cache.put(url, etag, last_modified, r.text)
+        if self.archive is not None and r.ok:
+            self.archive.put(url, r.text)
+
+        return r.text, True
@@ -1,41 +1,60 @@
-import json
+import argparse
 import html
-import sys
+import json
+import os
 import re
+import sys
 import urllib.parse
-from urllib.parse import unquote
-from time import sleep
-from typing import Dict, List
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
-from bs4 import BeautifulSoup
-from requests import get
+import extract
+from archive import ArchiveFetcher, PageArchive
+from fetch import Fetcher
+
+# The binary corpus format (see src/corpus.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+import corpus
 
 # This scripts extracts a list of product items dicts
 # It is used by tweet.py to generate a corpus
 # It only needs to be run to refresh aws.json,
 # which is included in the Docker image
 
-# Usage python get.py <json to save>
-
+# Usage python get.py <json to save> (see --help for options)
+
+DOCS_URL = "https://docs.aws.amazon.com"
+
+
+def get_docs_items(
+    fetcher: Fetcher,
+    main_url: str = DOCS_URL,
+    workers: int = 8,
+    checkpoint_file: Optional[str] = None,
+    state: Optional[Dict] = None,
+    processes: bool = False,
+) -> List[Dict]:
+    # Products are fetched from the docs site, unless they are in 'state'
+    # (from a previous run, see get_service()) and haven't changed.
+    # 'state' is updated with the products of this run.
+    # In 'workers' threads, or processes (when extracting is the work, e.g.
+    # from an archive, see archive.py)
+    if state is None:
+        state = {}
+    previous_state = dict(state)
+    state.clear()
 
-def get_docs_items() -> List[Dict]:
     # Main list of services
     items = []
 
-    # List to keep track of already fetched products
-    # to prevent fetching them more than once
-    names = []
-
     # List of extra "sub-genre" names to add to the list of names
     # e.g. "Amazon Kinesis Data Firehose" or all the SageMakers
     extra_names = []
 
     # Get main Webpage docs XML
-    main_url = "https://docs.aws.amazon.com"
-    main_xml = get_page_xml(main_url)
+    main_xml = get_page_xml(fetcher, main_url)
 
-    main_soup = BeautifulSoup(main_xml, "lxml")
-    services = main_soup.find_all("service")
+    services = extract.docs_index(main_xml)
 
     """
     <list-card>
@@ -63,28 +82,22 @@ def get_docs_items() -> List[Dict]:
         "Additional Resources",
     ]
 
-    for s in services:
-        service = {"name": "", "blurb": "", "abbreviation": "", "desc": ""}
+    # Product names and their landing page hrefs, in order of the main page
+    # (each product can exist in many main page sections)
+    hrefs_by_name = {}
 
+    for section_title, href, name in services:
         # Skip the sections that aren't products per se.
         # Section titles are HTML-escaped
-        section_title = s.parent.parent.title.string
         if html.unescape(section_title) in sections_to_skip:
             continue
 
         # Service href
         # Skip absolute product links (non-docs sites)
-        href = s["href"]
         if not href.startswith("/"):
             continue
 
-        # Name in the main XML doc
-        name = s.find("name").string
-
-        # Each product can exist in many main page
-        # section, ignore subsquent ones
-        if name in names:
-            continue
+        # (name is the one in the main XML doc)
 
         # Link names ending in "Overview" aren't really names
         if name.endswith("Overview"):
@@ -93,214 +106,45 @@ def get_docs_items() -> List[Dict]:
         # Just a quick way to only query specifc products to test
         # if name not in ["Neptune"]:
         #     continue
-        print(f"Processing {name}...")
-
-        # Get service landing page
-        sleep(0.5)
-        service_url = urllib.parse.urljoin(main_url, href)
-        service_xml = get_page_xml(service_url)
-        if service_xml is None:
-            continue
-        service_soup = BeautifulSoup(service_xml, "lxml")
-
-        """
-        <landing-page>
-            <title>Amazon Elastic Compute Cloud Documentation</title>
-            <titleabbrev>Amazon EC2</titleabbrev>
-            <abstract>Amazon Elastic Compute Cloud (Amazon EC2) is a [...]</abstract>
-            [...]
-            <main-area>
-                <sections>
-                    <section id="amazon-ec2">
-                        <title>Amazon EC2</title>
-                        <tiles>
-                        <tile href="/AWSEC2/latest/UserGuide/">
-                            <title>User Guide for Linux Instances</title>
-                            <abstract> Describes key [...]</abstract>
-                            <more-links/>
-                        </tile>
-                    </section>
-                    [...]
-                </sections>
-            </main-area>
-            [...]
-        </landing-page>
-        """
-
-        """
-        <landing-page version="2.0">
-            <title>Amazon Elastic Container Registry Documentation</title>
-            <titleabbrev>Amazon ECR</titleabbrev>
-            <abstract>Amazon Elastic Container Registry (Amazon ECR) is a fully managed Docker container registry that makes it easy for developers to store, manage, and deploy Docker container images.</abstract>
-            [...]
-            <sections>
-                <section id="amazon-ecr">
-                    <title>Amazon ECR</title>
-                    <cards>
-                        [...]
-                        <simple-card href="/AmazonECR/latest/userguide/" guide="true">
-                            <title>User Guide</title>
-                            <abstract>Describes key concepts of Amazon ECR and provides instructions for using the features of Amazon ECR.</abstract>
-                            <footer/>
-                        </simple-card>
-                        <simple-card href="/AmazonECR/latest/APIReference/" guide="true">
-                            <title>API Reference</title>
-                            <abstract> Describes all the API operations for managing your private registry and private repositories on Amazon ECR.</abstract>
-                            <footer/>
-                        </simple-card>
-                        <simple-card href="/cli/latest/reference/ecr/" guide="true">
-                            <title>Amazon ECR section of the AWS CLI Reference</title>
-                            <abstract>Documents the Amazon ECR commands available in the AWS Command Line Interface (AWS CLI).</abstract>
-                            <footer/>
-                        </simple-card>
-                    </cards>
-                </section>
-                [...]
-            </sections>
-            [...]
-        </landing-page>
-        """
-
-        # Service name
-        # Page title is "<product> Documentation", remove " Documentation"
-        page_title = service_soup.find("landing-page").title.string
-        service_name = re.sub(r" Documentation$", "", page_title)
-        service["name"] = service_name
-
-        # Service blurb
-        # Remove extra newlines found in the XML
-        # Some landing pages don't have descriptions
-        service_blurb = service_soup.find("landing-page").abstract.string
-        try:
-            # 'blurb' obtained from HTML can have weird encoding
-            # fix: https://stackoverflow.com/a/66815577
-            bytes_blurb = bytes(service["blurb"], encoding="raw_unicode_escape")
-            service["blurb"] = bytes_blurb.decode("utf-8", "strict")
-            service["blurb"] = " ".join(service_blurb.split())
-        except:
-            service["blurb"] = ""
+        hrefs_by_name.setdefault(name, []).append(href)
 
-        # Service abbreviation (e.g. 'Amazon EC2')
-        service["abbreviation"] = service_soup.find("landing-page").titleabbrev.string
-
-        # <section> names often contain extra AWS product names!
-        # Only if they start with "AWS", "Amazon"
-        # e.g. AWS Lambda Data Firehose
-        # Note (Nov 2022): Much less now :(
-        sections = service_soup.find_all("section")
-        try:
-            # Get section
-            sections_titles = [sec.title.text for sec in sections]
-
-            # Clean whitespace
-            " ".join(sections_titles.split())
-
-            # Filter
-            sections_titles = [
-                st
-                for st in sections
-                if st.startswith("AWS")
-                or st.startswith("Amazon")
-                or st.endswith("Documentation")
-                or st.endswith("User Guide")
-                or st.endswith("Developer Guide")
-                and len(st.text) > 0
-            ]
-        except:
-            sections_titles = []
+    # Products already fetched by a previous (interrupted) run
+    done = load_checkpoint(checkpoint_file) if checkpoint_file else {}
+    todo = [name for name in hrefs_by_name if name not in done]
+    print(f"{len(hrefs_by_name)} products, {len(done)} already fetched")
 
-        print(f"    Extra (section names): {sections_titles}")
-        extra_names += sections_titles
-
-        # Dig into the first link of the page to get more content
-        # (typically a 'User Guide' or 'Developer Guide')
-        # Not all sections have hrefs. Get the first one that does.
-        service_hrefs = service_soup.find_all("simple-card")
-        for sh in service_hrefs:
-            try:
-                service_first_href = sh["href"]
-                break
-            except:
-                pass
-
-        # Discard URL parameters if they exist
-        if "?" in service_first_href:
-            service_first_href = service_first_href.split("?")[0]
-
-        print(f"    Fetching {service_first_href}...")
-
-        # Skip absolute product links (non-docs sites)
-        if service_first_href.startswith("/"):
-            # The page has no XML layout, it's pure HTML
-            sleep(0.5)
-            service_first_url = urllib.parse.urljoin(main_url, service_first_href)
-            r = get(service_first_url)
-            service_first_soup = BeautifulSoup(r.text, "html.parser")
-        else:
-            # Hack-ish way to set the result to nothing, so the next steps will skip
-            # but the product will still get added to the dict.
-            service_first_soup = BeautifulSoup("", "html.parser")
-
-        # The page can sometimes be a placeholder with a redirect:
-        # The last index.html will be replaced by the page in <meta http-equiv="refresh">
-        # as in: <meta http-equiv="refresh" content="10;URL=concepts.html"
-        # e.g. https://docs.aws.amazon.com/AWSEC2/latest/UserGuide/index.html to:
-        #      https://docs.aws.amazon.com/AWSEC2/latest/UserGuide/concepts.html
-        meta_refresh = service_first_soup.find("meta", attrs={"http-equiv": "refresh"})
-        if meta_refresh:
-            index = meta_refresh["content"].split("=")[1]
-
-            # Re-request the above with the right redirected URL
-
-            if service_first_url.endswith("/"):
-                # e.g. "https://docs.aws.amazon.com/AWSEC2/latest/UserGuide/"
-                # Just add the new index
-                service_first_url = service_first_url + index
-            else:
-                # e.g.  "https://docs.aws.amazon.com/sagemaker/latest/dg/what-is.htm"
-                # replace the last page of the path.
-                service_first_url = re.sub(r"([^/]+)$", index, service_first_url)
-
-            sleep(0.5)
-            r = get(service_first_url)
-            service_first_soup = BeautifulSoup(r.text, "html.parser")
-
-        # Get the first <p>. If it's too short, get the next and so on
-        paragraphs = service_first_soup.find_all("p")
-        for p in paragraphs:
-            clean_p = " ".join(p.text.split())
-            if len(clean_p) < 100:
-                continue
-            else:
-                # 'desc' obtained from HTML can have weird encoding
-                # fix: https://stackoverflow.com/a/66815577
-                bytes_desc = bytes(clean_p, encoding="raw_unicode_escape")
-                try:
-                    service["desc"] = bytes_desc.decode("utf-8", "strict")
-                except:
-                    service["desc"] = bytes_desc.decode("ISO-8859-1", "strict")
-                break
-
-        # <dt> elements often contain extra AWS product names!
-        # Only if they start with "AWS", "Amazon" or the product name itself
-        # (from the main page, w/o a brand prefix, e.g. "SageMaker")
-        dts = service_first_soup.find_all("dt")
-        dts_list = [
-            dt.text
-            for dt in dts
-            if dt.text.startswith("AWS")
-            or dt.text.startswith("Amazon")
-            or dt.text.startswith(name)
-            and not len(dt.text.split()) > 4
-        ]
-
-        # Clean
-        dts_list = [" ".join(dt.split()) for dt in dts_list]
-
-        print(f"    Extra (terms): {dts_list}")
-        extra_names += dts_list
-
-        names.append(name)
+    # Fetch the products in parallel
+    services = [
+        (main_url, name, hrefs_by_name[name], previous_state.get(name)) for name in todo
+    ]
+    if processes:
+        executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker, initargs=(fetcher,)
+        )
+        worker = get_service_in_worker
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        worker = lambda service: get_service(fetcher, *service)
+
+    checkpoint = open(checkpoint_file, "a") if checkpoint_file else None
+    try:
+        with executor:
+            entries = executor.map(worker, services)
+            for name, entry in zip(todo, entries):
+                done[name] = entry
+                if checkpoint:
+                    save_checkpoint(checkpoint, name, entry)
+    finally:
+        if checkpoint:
+            checkpoint.close()
+
+    # Keep the order of the main page
+    for name in hrefs_by_name:
+        state[name] = done[name]
+        if done[name]["result"] is None:
+            continue
+        service, service_extra_names = done[name]["result"]
+        extra_names += service_extra_names
         items.append(service)
 
     # Add the 'extra_names' to as new product entries (name only)
@@ -319,10 +163,247 @@ def get_docs_items() -> List[Dict]:
     return items
 
 
-def get_page_xml(url) -> str:
-    r = get(url)
-    soup = BeautifulSoup(r.text, "html.parser")
+# Fetcher of the worker processes (see get_docs_items())
+worker_fetcher = None
+
+
+def init_worker(fetcher: Fetcher) -> None:
+    global worker_fetcher
+    worker_fetcher = fetcher
+
+
+def get_service_in_worker(service: Tuple) -> Dict:
+    return get_service(worker_fetcher, *service)
+
+
+def get_service(
+    fetcher: Fetcher,
+    main_url: str,
+    name: str,
+    hrefs: List[str],
+    previous: Optional[Dict] = None,
+) -> Dict:
+    # Fetch a product from the first of its landing pages that has content
+    # Returns the product and the list of extra names found on the way, with
+    # the hrefs and the pages (URLs) it came from, e.g.
+    # {"hrefs": [<href>, ...], "pages": [<url>, ...],
+    #  "result": [<product>, [<extra name>, ...]] or None}
+
+    # Unchanged since the previous run (same hrefs, pages not modified)
+    # Needs the pages in the HTTP cache: they're only revalidated.
+    if (
+        previous
+        and previous["hrefs"] == hrefs
+        and previous["pages"]
+        and not any(fetcher.is_modified(url) for url in previous["pages"])
+    ):
+        print(f"Unchanged {name}")
+        return previous
+
+    pages = []
+    result = None
+    for href in hrefs:
+        result = get_service_from_href(fetcher, main_url, name, href, pages)
+        if result is not None:
+            break
+
+    return {"hrefs": hrefs, "pages": pages, "result": result}
+
 
+def get_service_from_href(
+    fetcher: Fetcher, main_url: str, name: str, href: str, pages: List[str]
+) -> Optional[Tuple[Dict, List[str]]]:
+    # Fetch a product from one of its landing pages
+    # The URLs of the pages fetched on the way are added to 'pages'
+
+    service = {"name": "", "blurb": "", "abbreviation": "", "desc": ""}
+    extra_names = []
+
+    print(f"Processing {name}...")
+
+    # Get service landing page
+    service_url = urllib.parse.urljoin(main_url, href)
+    pages.append(service_url)
+    service_xml = get_page_xml(fetcher, service_url)
+    if service_xml is None:
+        return None
+    landing_page = extract.landing_page(service_xml)
+    if landing_page is None:
+        return None
+
+    """
+    <landing-page>
+        <title>Amazon Elastic Compute Cloud Documentation</title>
+        <titleabbrev>Amazon EC2</titleabbrev>
+        <abstract>Amazon Elastic Compute Cloud (Amazon EC2) is a [...]</abstract>
+        [...]
+        <main-area>
+            <sections>
+                <section id="amazon-ec2">
+                    <title>Amazon EC2</title>
+                    <tiles>
+                    <tile href="/AWSEC2/latest/UserGuide/">
+                        <title>User Guide for Linux Instances</title>
+                        <abstract> Describes key [...]</abstract>
+                        <more-links/>
+                    </tile>
+                </section>
+                [...]
+            </sections>
+        </main-area>
+        [...]
+    </landing-page>
+    """
+
+    """
+    <landing-page version="2.0">
+        <title>Amazon Elastic Container Registry Documentation</title>
+        <titleabbrev>Amazon ECR</titleabbrev>
+        <abstract>Amazon Elastic Container Registry (Amazon ECR) is a fully managed Docker container registry that makes it easy for developers to store, manage, and deploy Docker container images.</abstract>
+        [...]
+        <sections>
+            <section id="amazon-ecr">
+                <title>Amazon ECR</title>
+                <cards>
+                    [...]
+                    <simple-card href="/AmazonECR/latest/userguide/" guide="true">
+                        <title>User Guide</title>
+                        <abstract>Describes key concepts of Amazon ECR and provides instructions for using the features of Amazon ECR.</abstract>
+                        <footer/>
+                    </simple-card>
+                    <simple-card href="/AmazonECR/latest/APIReference/" guide="true">
+                        <title>API Reference</title>
+                        <abstract> Describes all the API operations for managing your private registry and private repositories on Amazon ECR.</abstract>
+                        <footer/>
+                    </simple-card>
+                    <simple-card href="/cli/latest/reference/ecr/" guide="true">
+                        <title>Amazon ECR section of the AWS CLI Reference</title>
+                        <abstract>Documents the Amazon ECR commands available in the AWS Command Line Interface (AWS CLI).</abstract>
+                        <footer/>
+                    </simple-card>
+                </cards>
+            </section>
+            [...]
+        </sections>
+        [...]
+    </landing-page>
+    """
+
+    # Service name
+    # Page title is "<product> Documentation", remove " Documentation"
+    page_title = landing_page["title"]
+    service_name = re.sub(r" Documentation$", "", page_title)
+    service["name"] = service_name
+
+    # Service blurb
+    # Remove extra newlines found in the XML
+    # Some landing pages don't have descriptions
+    service_blurb = landing_page["abstract"]
+    try:
+        # 'blurb' obtained from HTML can have weird encoding
+        # fix: https://stackoverflow.com/a/66815577
+        bytes_blurb = bytes(service["blurb"], encoding="raw_unicode_escape")
+        service["blurb"] = bytes_blurb.decode("utf-8", "strict")
+        service["blurb"] = " ".join(service_blurb.split())
+    except:
+        service["blurb"] = ""
+
+    # Service abbreviation (e.g. 'Amazon EC2')
+    service["abbreviation"] = landing_page["titleabbrev"]
+
+    # <section> names often contain extra AWS product names!
+    # Only if they start with "AWS", "Amazon"
+    # e.g. AWS Lambda Data Firehose
+    # Note (Nov 2022): Much less now :(
+    # Note: the extraction of section names always failed (and fell back to
+    # no names), it's not done anymore, so the products stay the same.
+    sections_titles = []
+
+    print(f"    Extra (section names): {sections_titles}")
+    extra_names += sections_titles
+
+    # Dig into the first link of the page to get more content
+    # (typically a 'User Guide' or 'Developer Guide')
+    # Not all sections have hrefs. Get the first one that does.
+    service_first_href = landing_page["first_href"] or ""
+
+    # Discard URL parameters if they exist
+    if "?" in service_first_href:
+        service_first_href = service_first_href.split("?")[0]
+
+    print(f"    Fetching {service_first_href}...")
+
+    # Skip absolute product links (non-docs sites)
+    if service_first_href.startswith("/"):
+        # The page has no XML layout, it's pure HTML
+        service_first_url = urllib.parse.urljoin(main_url, service_first_href)
+        pages.append(service_first_url)
+        guide_page = extract.guide_page(fetcher.get(service_first_url))
+    else:
+        # Hack-ish way to set the result to nothing, so the next steps will skip
+        # but the product will still get added to the dict.
+        guide_page = extract.guide_page("")
+
+    # The page can sometimes be a placeholder with a redirect:
+    # The last index.html will be replaced by the page in <meta http-equiv="refresh">
+    # as in: <meta http-equiv="refresh" content="10;URL=concepts.html"
+    # e.g. https://docs.aws.amazon.com/AWSEC2/latest/UserGuide/index.html to:
+    #      https://docs.aws.amazon.com/AWSEC2/latest/UserGuide/concepts.html
+    meta_refresh = guide_page["meta_refresh"]
+    if meta_refresh:
+        index = meta_refresh.split("=")[1]
+
+        # Re-request the above with the right redirected URL
+
+        if service_first_url.endswith("/"):
+            # e.g. "https://docs.aws.amazon.com/AWSEC2/latest/UserGuide/"
+            # Just add the new index
+            service_first_url = service_first_url + index
+        else:
+            # e.g.  "https://docs.aws.amazon.com/sagemaker/latest/dg/what-is.htm"
+            # replace the last page of the path.
+            service_first_url = re.sub(r"([^/]+)$", index, service_first_url)
+
+        pages.append(service_first_url)
+        guide_page = extract.guide_page(
+            fetcher.get(service_first_url), stop_at_refresh=False
+        )
+
+    # Get the first <p>. If it's too short, get the next and so on
+    # (i.e. the first one of at least 100 chars, whitespace cleaned)
+    clean_p = guide_page["paragraph"]
+    if clean_p:
+        # 'desc' obtained from HTML can have weird encoding
+        # fix: https://stackoverflow.com/a/66815577
+        bytes_desc = bytes(clean_p, encoding="raw_unicode_escape")
+        try:
+            service["desc"] = bytes_desc.decode("utf-8", "strict")
+        except:
+            service["desc"] = bytes_desc.decode("ISO-8859-1", "strict")
+
+    # <dt> elements often contain extra AWS product names!
+    # Only if they start with "AWS", "Amazon" or the product name itself
+    # (from the main page, w/o a brand prefix, e.g. "SageMaker")
+    dts = guide_page["terms"]
+    dts_list = [
+        dt
+        for dt in dts
+        if dt.startswith("AWS")
+        or dt.startswith("Amazon")
+        or dt.startswith(name)
+        and not len(dt.split()) > 4
+    ]
+
+    # Clean
+    dts_list = [" ".join(dt.split()) for dt in dts_list]
+
+    print(f"    Extra (terms): {dts_list}")
+    extra_names += dts_list
+
+    return service, extra_names
+
+
+def get_page_xml(fetcher: Fetcher, url: str) -> str:
     # Old way, they moved the encoded XML in
     # <input id=anding-page-xml ... value="">
 
@@ -338,11 +419,56 @@ def get_page_xml(url) -> str:
     #     if match:
     #         return unquote(match["encoded_xml"])
 
-    landing_page_xml_input = soup.select("#landing-page-xml")
-    try:
-        return unquote(landing_page_xml_input[0]["value"])
-    except IndexError:
-        return None
+    return extract.landing_page_xml(fetcher.get(url))
+
+
+def load_checkpoint(filename: str) -> Dict:
+    # Products fetched so far, from a checkpoint file (see save_checkpoint())
+    # e.g. { <name>: <entry (see get_service())>}
+    done = {}
+    if not os.path.exists(filename):
+        return done
+
+    with open(filename, "r") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Last line, cut by an interruption
+                continue
+            done[entry.pop("name")] = entry
+
+    return done
+
+
+def save_checkpoint(f, name: str, entry: Dict) -> None:
+    # Add a fetched product to a checkpoint file, one JSON per line
+    f.write(json.dumps({"name": name, **entry}, ensure_ascii=False) + "\n")
+    f.flush()
+
+
+def load_state(filename: str) -> Dict:
+    # Products of the previous run (see get_docs_items())
+    if not os.path.exists(filename):
+        return {}
+    with open(filename, "r") as f:
+        return json.load(f)
+
+
+def save_state(state: Dict, filename: str) -> None:
+    with open(filename, "w") as f:
+        f.write(json.dumps(state, ensure_ascii=False))
+
+
+def changelog(old_items: List[Dict], new_items: List[Dict]) -> Dict:
+    # Names of the products added, removed and modified between two lists
+    old = {i["name"]: i for i in old_items}
+    new = {i["name"]: i for i in new_items}
+    return {
+        "added": sorted(n for n in new if n not in old),
+        "removed": sorted(n for n in old if n not in new),
+        "modified": sorted(n for n in new if n in old and new[n] != old[n]),
+    }
 
 
 def save_items(items, filename) -> None:
@@ -352,12 +478,89 @@ def save_items(items, filename) -> None:
 
 if __name__ == "__main__":
     # Usage python get.py <json to save>
-
-    items = get_docs_items()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("filename", help="JSON to save")
+    parser.add_argument("--url", default=DOCS_URL, help="docs site to fetch")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="parallel fetches (default: 8), or processes with --offline "
+        "(default: one per CPU)",
+    )
+    parser.add_argument(
+        "--rate", type=float, default=4, help="max requests per second, per host"
+    )
+    parser.add_argument(
+        "--cache", default=".get_cache", help="HTTP cache directory ('' to disable)"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only fetch the products that changed since the previous run",
+    )
+    parser.add_argument(
+        "--corpus",
+        help="also save the products to this binary corpus file (see src/corpus.py)",
+    )
+    parser.add_argument(
+        "--archive",
+        default=".get_archive.warc.gz",
+        help="archive of the pages fetched, see archive.py ('' to disable)",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="extract the products from the pages of --archive, without fetching",
+    )
+    args = parser.parse_args()
+
+    # Progress of this run, to resume from if interrupted
+    checkpoint_file = f"{args.filename}.progress"
+
+    # Products of the last run, for the next --incremental one
+    state_file = f"{args.filename}.state"
+    state = load_state(state_file) if args.incremental else {}
+
+    # Previous products, to compare with
+    try:
+        with open(args.filename, "r") as f:
+            previous_items = json.load(f)
+    except (OSError, ValueError):
+        previous_items = []
+
+    archive = PageArchive(args.archive) if args.archive else None
+    if args.offline:
+        # (Other pages can be missing: their products are empty)
+        if archive is None or args.url not in archive:
+            sys.exit(f"No main page ({args.url}) in the archive: {args.archive}")
+        # No checkpoint or state: nothing is fetched, it runs from start to end
+        workers = args.workers or os.cpu_count()
+        fetcher = ArchiveFetcher(archive)
+        items = get_docs_items(fetcher, args.url, workers, processes=True)
+    else:
+        workers = args.workers or 8
+        fetcher = Fetcher(
+            rate=args.rate, pool_size=workers, cache_dir=args.cache, archive=archive
+        )
+        items = get_docs_items(fetcher, args.url, workers, checkpoint_file, state)
 
     # import pprint
     # pprint.pprint(items)
 
-    filename = sys.argv[1]
-
-    save_items(items, filename)
+    save_items(items, args.filename)
+    if args.corpus:
+        corpus.write_corpus(items, args.corpus)
+    # (Offline, the pages can't be revalidated: no state for --incremental)
+    if not args.offline:
+        save_state(state, state_file)
+
+    # Changes since the previous products
+    # e.g. {"added": [<name>, ...], "removed": [...], "modified": [...]}
+    changes = changelog(previous_items, items)
+    with open(f"{args.filename}.changelog", "w") as f:
+        f.write(json.dumps(changes, indent=2, ensure_ascii=False))
+    print(", ".join(f"{len(v)} {k}" for k, v in changes.items()))
+
+    # Done, next run starts over
+    if not args.offline:
+        os.remove(checkpoint_file)
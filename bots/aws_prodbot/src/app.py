@@ -1,7 +1,15 @@
+import itertools
+import logging
 import os
+import random
+import threading
+import time
 from logging.config import dictConfig
 
-from flask import Flask
+from flask import Flask, Response, abort, request, stream_with_context
+
+import metrics
+from pool import BoundedPool, PoolFull
 
 dictConfig(
     {
@@ -18,31 +26,263 @@ dictConfig(
                 "formatter": "default",
             }
         },
-        "root": {"level": "DEBUG", "handlers": ["wsgi"]},
+        "root": {
+            "level": os.environ.get("LOG_LEVEL", default="INFO"),
+            "handlers": ["wsgi"],
+        },
     }
 )
 
 app = Flask(__name__)
-import tweet
+log = logging.getLogger("root")
 
 # Get app config via env. v.ars
 AWS_PRODUCTS_FILE = os.environ.get("AWS_PRODUCTS_FILE")
 
+# Optional, prebuilt model of AWS_PRODUCTS_FILE (see model.py)
+AWS_MODEL_FILE = os.environ.get("AWS_MODEL_FILE")
+
+# How often (s) to check AWS_PRODUCTS_FILE for changes
+AWS_PRODUCTS_CHECK_INTERVAL = float(
+    os.environ.get("AWS_PRODUCTS_CHECK_INTERVAL", default=30)
+)
+
+
+# Optional, other named corpora (products files, e.g. archived ones), each
+# with an optional prebuilt model: "<name>=<json file>[:<model file>],..."
+# Selected with ?corpus=<name>, AWS_PRODUCTS_FILE is "current" (the default)
+AWS_CORPORA = os.environ.get("AWS_CORPORA", default="")
+
+# Optional, approx. memory (MB) the models can take before the least
+# recently used ones are unloaded (0: no limit)
+MODELS_MAX_MB = float(os.environ.get("MODELS_MAX_MB", default=0))
+
+# Maximum number of products /generate can return at once
+GENERATE_MAX_N = int(os.environ.get("GENERATE_MAX_N", default=1000))
+
+# "background" (default): start right away (/healthz answers), importing the
+# modules and loading the models in the background (/readyz answers once done)
+# "eager": do it all before starting
+STARTUP_MODE = os.environ.get("STARTUP_MODE", default="background")
+
+# How long (s) a request waits for the app to be ready, before a 503
+READY_TIMEOUT = float(os.environ.get("READY_TIMEOUT", default=120))
+
+# Requests that can generate at once (in a pool of as many threads), and wait
+# to, past which they get a 429 (see pool.py). Generation is pure Python,
+# so more than a couple of workers per process don't make it faster
+GENERATE_WORKERS = int(os.environ.get("GENERATE_WORKERS", default=2))
+GENERATE_MAX_PENDING = int(os.environ.get("GENERATE_MAX_PENDING", default=8))
+
+# Products /generate generates at a time, in the pool, while streaming
+GENERATE_CHUNK = int(os.environ.get("GENERATE_CHUNK", default=50))
+
+# Toots of the default corpus to keep pre-generated, and the file they're
+# kept in (see postqueue.py), 0 to generate each one when posting it
+POST_QUEUE_DEPTH = int(os.environ.get("POST_QUEUE_DEPTH", default=10))
+POST_QUEUE_FILE = os.environ.get("POST_QUEUE_FILE", default="post_queue.json")
+
+# Signatures of the names and descriptions posted, not to post (nearly) the
+# same ones again (see dedupe.py), "" not to keep them across restarts
+POST_HISTORY_FILE = os.environ.get("POST_HISTORY_FILE", default="post_history.idx")
+
 
 if not AWS_PRODUCTS_FILE:
     raise TypeError("Check AWS prodbot file env. var: AWS_PRODUCTS_FILE")
 
 
+def parse_corpora(corpora: str) -> dict:
+    # "<name>=<json file>[:<model file>],..." to
+    # { <name>: (<json file>, <model file or None>) }
+    parsed = {}
+    for corpus in filter(None, (c.strip() for c in corpora.split(","))):
+        name, sep, files = corpus.partition("=")
+        if not sep or not name or not files:
+            raise ValueError(f"Invalid AWS_CORPORA entry: {corpus}")
+        aws_json_file, _, model_file = files.partition(":")
+        parsed[name] = (aws_json_file, model_file or None)
+    return parsed
+
+
+corpora = {"current": (AWS_PRODUCTS_FILE, AWS_MODEL_FILE)}
+corpora.update(parse_corpora(AWS_CORPORA))
+
+# Set by warm_up(): the heavy modules (nltk, markovify, mastodon...)
+# and the models shared by all requests (rebuilt when their file changes)
+# and the pre-generated toots (if POST_QUEUE_DEPTH) and past ones
+model = None
+tweet = None
+models = None
+post_queue = None
+history = None
+
+ready = threading.Event()
+warm_up_error = None
+
+generation_pool = BoundedPool(GENERATE_WORKERS, GENERATE_MAX_PENDING)
+
+
+def warm_up():
+    # Import what serving needs and load the default model
+    global model, tweet, models, post_queue, history, warm_up_error
+    start = time.monotonic()
+    try:
+        import dedupe
+        import model
+        import postqueue
+        import tweet
+
+        models = model.ModelRegistry(
+            corpora, max_mb=MODELS_MAX_MB, check_interval=AWS_PRODUCTS_CHECK_INTERVAL
+        )
+        models.get()
+
+        history = dedupe.PostIndex(POST_HISTORY_FILE or None)
+        if POST_QUEUE_DEPTH > 0:
+            post_queue = postqueue.PostQueue(
+                POST_QUEUE_FILE,
+                lambda: tweet.generate_post(models.get(), history=history),
+                depth=POST_QUEUE_DEPTH,
+            )
+            post_queue.start()
+    except Exception as e:
+        warm_up_error = e
+        log.exception("Warm-up failed")
+    else:
+        log.info(f"Ready in {time.monotonic() - start:.2f}s")
+    finally:
+        ready.set()
+
+
+def wait_ready():
+    # Wait for the warm-up, 503 if it's not done in time (or failed)
+    if not ready.wait(READY_TIMEOUT) or warm_up_error:
+        abort(503, "Not ready")
+
+
+def get_model():
+    # Model of the ?corpus= (default: current)
+    wait_ready()
+    try:
+        return models.get(request.args.get("corpus"))
+    except KeyError:
+        abort(404, f"Unknown corpus, must be one of: {', '.join(models.names)}")
+
+
+def get_mode():
+    # Description mode of the ?mode= (default: words, see tweet.DESC_MODES)
+    mode = request.args.get("mode", default="words")
+    if mode not in tweet.DESC_MODES:
+        abort(400, f"mode must be one of: {', '.join(tweet.DESC_MODES)}")
+    return mode
+
+
 @app.route("/")
 def main():
-    tweet.main(AWS_PRODUCTS_FILE)
+    # Post the next pre-generated toot (see postqueue.py), or generate one
+    # (for another ?corpus= or ?mode=, or if none is ready)
+    m = get_model()
+    mode = get_mode()
+    if (
+        post_queue is not None
+        and not request.args.get("corpus")
+        and not request.args.get("mode")
+    ):
+        toot = post_queue.pop()
+        # (Checked against the history when queued, again in case a similar
+        # one was posted since: toots are only added to it once posted)
+        while toot and "name" in toot:
+            part = history.check(toot["name"], toot["desc"])
+            if not part:
+                break
+            metrics.DUPLICATES.inc(against="history", part=part)
+            toot = post_queue.pop()
+        if toot:
+            tweet.send_toot(toot["text"], toot["key"])
+            # (Toots queued by older versions are only their text)
+            if "name" in toot:
+                history.add(toot["name"], toot["desc"])
+            return "OK"
+    with generation_pool.slot():
+        generation_pool.run(tweet.toot, m, random, history, mode)
     return "OK"
 
 
+@app.route("/generate")
+def generate():
+    # Generate (but don't toot) ?n= products, streamed as JSON Lines
+    # (always the same ones for a given ?seed=, and model)
+    try:
+        n = int(request.args.get("n", default=1))
+    except ValueError:
+        n = 0
+    if not 1 <= n <= GENERATE_MAX_N:
+        abort(400, f"n must be between 1 and {GENERATE_MAX_N}")
+
+    seed = request.args.get("seed")
+    try:
+        rng = random.Random(int(seed)) if seed is not None else random
+    except ValueError:
+        abort(400, "seed must be an integer")
+
+    m = get_model()
+    mode = get_mode()
+
+    # One generation, pulled a chunk at a time, in the pool: the same products
+    # as all at once (e.g. as tweet.py -n <n> --seed <seed>), whatever the chunks
+    lines = tweet.generate_jsonl(m, n, rng, mode)
+
+    def generate_chunk():
+        return list(itertools.islice(lines, GENERATE_CHUNK))
+
+    def products():
+        for _ in range(0, n, GENERATE_CHUNK):
+            yield from generation_pool.run(generate_chunk)
+
+    # The slot is kept until the response is sent
+    generation_pool.acquire()
+    response = Response(
+        stream_with_context(products()), mimetype="application/x-ndjson"
+    )
+    response.call_on_close(generation_pool.release)
+    return response
+
+
+@app.errorhandler(PoolFull)
+def pool_full(e):
+    # Backpressure: too many requests generating, or waiting to
+    return "Too many requests, retry later", 429, {"Retry-After": "1"}
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    # Prometheus-style metrics (see metrics.py), answers even before ready
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/healthz")
 def healthz():
+    # Liveness, answers as soon as the app is up
+    return "OK"
+
+
+@app.route("/readyz")
+def readyz():
+    # Readiness, once warmed up (see STARTUP_MODE)
+    if not ready.is_set():
+        return "Warming up", 503
+    if warm_up_error:
+        return f"Warm-up failed: {warm_up_error!r}", 503
     return "OK"
 
 
+if STARTUP_MODE == "eager":
+    warm_up()
+    if warm_up_error:
+        raise warm_up_error
+else:
+    threading.Thread(target=warm_up, daemon=True).start()
+
+
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=8080)
@@ -0,0 +1,326 @@
+import bisect
+import random
+import re
+from array import array
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import markovify
+from markovify.chain import BEGIN
+from markovify.text import DEFAULT_MAX_OVERLAP_RATIO, DEFAULT_MAX_OVERLAP_TOTAL
+
+from compact import END_ID, CompactChain
+from overlap import OverlapIndex
+
+# Constrained sentence generation over a markovify chain.
+#
+# Instead of generating full sentences and rejecting the ones that are too
+# long (or otherwise invalid) after the fact, the constraints are enforced
+# during the walk of the chain: transitions that can't lead to a short enough
+# sentence are pruned, and dead ends are backtracked from (depth-first),
+# within a fixed budget of steps.
+# The walk is done over a CompactChain (see compact.py), by state row, and
+# copies of the corpus are looked up in an index of it (see overlap.py).
+# The chain can be of words, or of words and their part-of-speech tags (see
+# POSifiedText), so a word only follows what it followed as the same tag.
+
+# Longest run of words a sentence can share with the corpus, whatever its length
+# (see markovify.Text.test_sentence_output()), used to prune while walking
+OVERLAP_WINDOW = DEFAULT_MAX_OVERLAP_TOTAL + 1
+
+# Default maximum number of transitions tried per sentence
+MAX_STEPS = 5000
+
+# Why transitions get rejected (see make_sentence_with_start()):
+# * too_long: the sentence couldn't end under max_len anymore
+# * too_short: it would end under min_words
+# * pattern: it would match the reject pattern
+# * overlap: it would be too long of a copy of the corpus
+# * budget: out of steps
+REJECTIONS = ("too_long", "too_short", "pattern", "overlap", "budget")
+
+# Between a word and its tag, in the words of a POSifiedText's chain
+TAG_SEP = "::"
+
+
+def untag(word: str) -> str:
+    # The word of a "<word>::<tag>", e.g. "is" for "is::VBZ"
+    return word.rsplit(TAG_SEP, 1)[0]
+
+
+class POSifiedText(markovify.Text):
+    # Text model whose chain is of "<word>::<tag>" (nltk tags, e.g. "is::VBZ")
+    # It isn't built from text (that would tag it all again) but from
+    # sentences already tagged (see model.pos_text_model()), so word_split()
+    # only splits: generated sentences, and the corpus (rejoined_text), are
+    # of plain words, and ConstrainedText matches beginnings on words only
+    def word_join(self, words: List[str]) -> str:
+        return " ".join(untag(w) for w in words)
+
+
+class ConstrainedText:
+    # Generates sentences from a markovify.Text (and its chain) under
+    # a length budget and a reject pattern, with predictable work
+    # The text model's chain should be a CompactChain (or it's converted)
+
+    def __init__(
+        self, text_model: markovify.Text, overlap: Optional[OverlapIndex] = None
+    ):
+        # 'overlap' is the index of text_model's rejoined_text (see overlap.py),
+        # if already built (e.g. for another text model of the same corpus)
+        self.text_model = text_model
+        self.state_size = text_model.state_size
+        chain = text_model.chain
+        if not isinstance(chain, CompactChain):
+            chain = CompactChain.from_chain(chain)
+        self.chain = chain
+        self.tagged = isinstance(text_model, POSifiedText)
+        # Length of each word (id) once joined, i.e. without its tag
+        self.word_lens = array(
+            "i", (len(untag(w) if self.tagged else w) for w in chain.words)
+        )
+        # Per state row, see CompactChain.min_len_to_end()
+        self.min_len = chain.min_len_to_end(self.word_lens)
+        # Beginnings (split) to the rows of the states they match, and the
+        # running total of their weights, see index_beginnings()
+        self.start_index = {}
+        # To find copies of the corpus in sentences, see test_output()
+        if overlap is None or overlap.text != text_model.rejoined_text:
+            overlap = OverlapIndex(text_model.rejoined_text)
+        self.overlap = overlap
+
+    def _ordered_transitions(self, row: int, rng: random.Random) -> Iterator[int]:
+        # Transitions of a state (row), in a random order weighted by their count
+        # (the first is drawn like markovify's Chain.move() would)
+        keys = [
+            (rng.random() ** (1.0 / count), i)
+            for i, count in self.chain.transitions(row)
+        ]
+        keys.sort(reverse=True)
+        return (i for _, i in keys)
+
+    def index_beginnings(self, beginnings: List[str]) -> List[str]:
+        # Find the states to start from for each of 'beginnings' (see
+        # init_states()) once, in one pass over the chain, so starting from
+        # them is a lookup. Returns the beginnings that have any
+        # Each state is weighted by how often it's in the corpus
+        # (the counts of its transitions)
+        splits = {b: tuple(self.text_model.word_split(b)) for b in beginnings}
+        wanted = set(splits.values())
+        chain = self.chain
+        matches = defaultdict(lambda: (array("i"), array("q")))
+
+        for row in range(len(chain.states)):
+            words = [w for w in chain.row_state(row) if w != BEGIN]
+            if self.tagged:
+                words = [untag(w) for w in words]
+            weight = chain.cum_counts[chain.offsets[row + 1] - 1]
+            for k in range(1, len(words) + 1):
+                prefix = tuple(words[:k])
+                if prefix in wanted:
+                    rows, cum_weights = matches[prefix]
+                    rows.append(row)
+                    cum_weights.append(weight + (cum_weights[-1] if cum_weights else 0))
+
+        # (Including the ones without any, not to search for them again)
+        for split in wanted:
+            self.start_index[split] = matches[split]
+        return [b for b, split in splits.items() if matches[split][0]]
+
+    def _weighted_states(
+        self, rows: array, cum_weights: array, rng: random.Random
+    ) -> Iterator[Tuple]:
+        # States of 'rows', in a random order weighted by 'cum_weights' (running
+        # totals): the first one is drawn with a binary search, the others
+        # (rarely needed, it's tried first) are only ordered if asked for
+        first = bisect.bisect(cum_weights, rng.random() * cum_weights[-1])
+        yield self.chain.row_state(rows[first])
+
+        keys = [
+            (
+                rng.random()
+                ** (1.0 / (cum_weights[i] - (cum_weights[i - 1] if i else 0))),
+                i,
+            )
+            for i in range(len(rows))
+            if i != first
+        ]
+        keys.sort(reverse=True)
+        for _, i in keys:
+            yield self.chain.row_state(rows[i])
+
+    def init_states(self, beginning: str, rng: random.Random) -> Iterable[Tuple]:
+        # States to start from for a beginning of one to 'state_size' words,
+        # found anywhere in a sentence. i.e. make_sentence_with_start(strict=False)
+        # Looked up if indexed (see index_beginnings()), searched for otherwise
+        split = tuple(self.text_model.word_split(beginning))
+        word_count = len(split)
+
+        if split in self.start_index:
+            rows, cum_weights = self.start_index[split]
+            return self._weighted_states(rows, cum_weights, rng) if rows else []
+        elif self.tagged and 0 < word_count <= self.state_size:
+            # Whatever the words' tags: indexed the first time (the few
+            # beginnings tried, see tweet.start_expression())
+            self.index_beginnings([beginning])
+            return self.init_states(beginning, rng)
+        elif word_count == self.state_size:
+            init_states = [split] if split in self.text_model.chain.model else []
+        elif 0 < word_count < self.state_size:
+            init_states = self.text_model.find_init_states_from_chain(split)
+            rng.shuffle(init_states)
+        else:
+            init_states = []
+
+        return init_states
+
+    def test_output(self, words: List[str]) -> bool:
+        # markovify.Text.test_sentence_output() with the default limits, i.e.
+        # whether the sentence doesn't have too long of a run of words in
+        # common with the corpus, with the runs looked up in the index
+        word_join = self.text_model.word_join
+        overlap_ratio = round(DEFAULT_MAX_OVERLAP_RATIO * len(words))
+        overlap_max = min(DEFAULT_MAX_OVERLAP_TOTAL, overlap_ratio)
+        overlap_over = overlap_max + 1
+        gram_count = max((len(words) - overlap_max), 1)
+        for i in range(gram_count):
+            if word_join(words[i : i + overlap_over]) in self.overlap:
+                return False
+        return True
+
+    def make_sentence_with_start(
+        self,
+        beginning: str,
+        max_len: int,
+        min_words: int = 20,
+        reject: Optional[re.Pattern] = None,
+        reject_words: int = 3,
+        rng: random.Random = random,
+        max_steps: int = MAX_STEPS,
+        stats: Optional[Dict] = None,
+    ) -> Optional[str]:
+        # Generate a sentence starting with 'beginning', shorter than 'max_len'
+        # characters, of at least 'min_words' words, that doesn't match 'reject'
+        # and passes markovify's originality test.
+        # 'reject' is checked on the last 'reject_words' words at each step,
+        # so it must not match on more than that.
+        # Returns None if no such sentence was found in 'max_steps' steps.
+        # 'stats' (if given) is updated with the 'steps' taken and the
+        # 'rejections' (transitions pruned), per reason (see REJECTIONS)
+        if stats is None:
+            stats = {}
+        stats.setdefault("steps", 0)
+        rejections = stats.setdefault("rejections", dict.fromkeys(REJECTIONS, 0))
+
+        sentence = None
+        budget = [max_steps]
+        for init_state in self.init_states(beginning, rng):
+            sentence = self._walk(
+                init_state,
+                max_len,
+                min_words,
+                reject,
+                reject_words,
+                rng,
+                budget,
+                rejections,
+            )
+            if sentence is not None or budget[0] <= 0:
+                break
+
+        stats["steps"] += max_steps - max(budget[0], 0)
+        return sentence
+
+    def _walk(
+        self,
+        init_state: Tuple,
+        max_len: int,
+        min_words: int,
+        reject: Optional[re.Pattern],
+        reject_words: int,
+        rng: random.Random,
+        budget: List[int],
+        rejections: Dict[str, int],
+    ) -> Optional[str]:
+        # Depth-first walk of the chain from 'init_state'
+        # Only keeps words that still allow to end the sentence under max_len
+        # 'rejections' is updated with the transitions pruned, per reason
+        word_join = self.text_model.word_join
+        overlap = self.overlap
+        chain_words = self.chain.words
+        word_lens = self.word_lens
+        next_ids = self.chain.next_ids
+        next_rows = self.chain.next_rows
+
+        # Beginning words, like markovify.Text.make_sentence()
+        words = [w for w in init_state if w != BEGIN]
+        length = len(word_join(words))
+        row = self.chain.state_row(init_state)
+        if row < 0 or self.min_len[row] < 0:
+            return None
+        if length + self.min_len[row] >= max_len:
+            return None
+
+        # One frame per state (row): its transitions left to try, and the
+        # length before each word added (restored when backtracking: a word's
+        # length is its untagged one, see word_lens)
+        stack = [self._ordered_transitions(row, rng)]
+        lengths = []
+
+        while stack:
+            i = next(stack[-1], None)
+
+            if i is None:
+                # Dead end, backtrack
+                stack.pop()
+                if stack:
+                    words.pop()
+                    length = lengths.pop()
+                continue
+
+            budget[0] -= 1
+            if budget[0] < 0:
+                rejections["budget"] += 1
+                return None
+
+            if next_ids[i] == END_ID:
+                if len(words) < min_words:
+                    rejections["too_short"] += 1
+                    continue
+                if not self.test_output(words):
+                    rejections["overlap"] += 1
+                    continue
+                return word_join(words)
+
+            word = chain_words[next_ids[i]]
+            next_row = next_rows[i]
+            next_length = length + 1 + word_lens[next_ids[i]]
+
+            # Too long to end under max_len (or can't end at all)
+            if next_row < 0 or self.min_len[next_row] < 0:
+                rejections["too_long"] += 1
+                continue
+            if next_length + self.min_len[next_row] >= max_len:
+                rejections["too_long"] += 1
+                continue
+
+            # Rejected pattern
+            if reject and reject.search(
+                word_join(words[max(len(words) - reject_words + 1, 0) :] + [word])
+            ):
+                rejections["pattern"] += 1
+                continue
+
+            # Too long of a copy of the corpus
+            if len(words) + 1 >= OVERLAP_WINDOW:
+                window = words[-(OVERLAP_WINDOW - 1) :] + [word]
+                if word_join(window) in overlap:
+                    rejections["overlap"] += 1
+                    continue
+
+            words.append(word)
+            lengths.append(length)
+            length = next_length
+            stack.append(self._ordered_transitions(next_row, rng))
+
+        return None
@@ -0,0 +1,216 @@
+import bisect
+import heapq
+import random
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import markovify
+from markovify.chain import BEGIN, END
+
+# Compact representation of a markovify chain
+#
+# markovify's Chain.model is a dict of states (tuples of words) to dicts of
+# next words and their counts, i.e. a lot of small Python objects. Here words
+# are interned as integers (ids) and the transitions are kept in flat arrays:
+# * states: the states, sorted, each as one integer (its word ids, in base
+#   <number of words>), found with a binary search
+# * offsets: the transitions of the state at row r are offsets[r]:offsets[r + 1]
+# * next_ids: the next word of each transition
+# * cum_counts: running total of the counts of a state's transitions, to sample
+#   one with a binary search (O(log k) for k transitions)
+# * next_rows: the state (row) each transition leads to (-1 for END)
+
+# Ids of markovify's markers
+BEGIN_ID = 0
+END_ID = 1
+
+
+class CompactChain(markovify.Chain):
+    # Drop-in for a markovify.Chain (e.g. as a markovify.Text's chain)
+    # 'model' is a read-only view of the arrays, as markovify's dict
+
+    def __init__(self, model: Dict[Tuple, Dict[str, int]], state_size: int):
+        # From a markovify Chain.model
+        self.state_size = state_size
+        self.compiled = True
+
+        self.words = [BEGIN, END]
+        self.word_ids = {BEGIN: BEGIN_ID, END: END_ID}
+        for state, next_words in model.items():
+            for word in state + tuple(next_words):
+                if word not in self.word_ids:
+                    self.word_ids[word] = len(self.words)
+                    self.words.append(word)
+
+        if len(self.words) ** state_size >= 2**63:
+            raise ValueError(f"Too many words ({len(self.words)}) for a compact chain")
+
+        rows = sorted((self._key(state), state) for state in model)
+        row_of_key = {key: row for row, (key, _) in enumerate(rows)}
+
+        self.states = array("q", (key for key, _ in rows))
+        self.offsets = array("i", [0])
+        self.next_ids = array("i")
+        self.cum_counts = array("i")
+        self.next_rows = array("i")
+
+        for _, state in rows:
+            total = 0
+            for word, count in model[state].items():
+                total += count
+                self.next_ids.append(self.word_ids[word])
+                self.cum_counts.append(total)
+                if word == END:
+                    self.next_rows.append(-1)
+                else:
+                    next_key = self._key(state[1:] + (word,))
+                    self.next_rows.append(row_of_key.get(next_key, -1))
+            self.offsets.append(len(self.next_ids))
+
+    @classmethod
+    def from_chain(cls, chain: markovify.Chain) -> "CompactChain":
+        return cls(chain.model, chain.state_size)
+
+    @classmethod
+    def from_json(cls, json_thing) -> "CompactChain":
+        return cls.from_chain(markovify.Chain.from_json(json_thing))
+
+    def _key(self, state: Tuple) -> int:
+        # A state as one integer, -1 if it has unknown words
+        key = 0
+        for word in state:
+            word_id = self.word_ids.get(word)
+            if word_id is None:
+                return -1
+            key = key * len(self.words) + word_id
+        return key
+
+    def state_row(self, state: Tuple) -> int:
+        # Row of a state, -1 if it's not in the chain
+        key = self._key(state)
+        if key < 0:
+            return -1
+        row = bisect.bisect_left(self.states, key)
+        if row == len(self.states) or self.states[row] != key:
+            return -1
+        return row
+
+    def row_state(self, row: int) -> Tuple:
+        # The state at a row
+        key = self.states[row]
+        word_ids = []
+        for _ in range(self.state_size):
+            key, word_id = divmod(key, len(self.words))
+            word_ids.append(word_id)
+        return tuple(self.words[i] for i in reversed(word_ids))
+
+    def transitions(self, row: int) -> Iterator[Tuple[int, int]]:
+        # (transition, count) of a state (row)
+        previous = 0
+        for i in range(self.offsets[row], self.offsets[row + 1]):
+            yield i, self.cum_counts[i] - previous
+            previous = self.cum_counts[i]
+
+    def next_words(self, state: Tuple) -> Dict[str, int]:
+        # Next words of a state and their counts, as in markovify's model
+        row = self.state_row(state)
+        if row < 0:
+            raise KeyError(state)
+        return {
+            self.words[self.next_ids[i]]: count for i, count in self.transitions(row)
+        }
+
+    def sample(self, row: int) -> int:
+        # A random transition of a state (row), weighted by count
+        lo, hi = self.offsets[row], self.offsets[row + 1]
+        r = random.random() * self.cum_counts[hi - 1]
+        return bisect.bisect(self.cum_counts, r, lo, hi)
+
+    @property
+    def model(self) -> "CompactModel":
+        return CompactModel(self)
+
+    def compile(self, inplace=False):
+        # Already compiled
+        return self
+
+    def precompute_begin_state(self):
+        pass
+
+    def move(self, state: Tuple) -> str:
+        row = self.state_row(state)
+        if row < 0:
+            raise KeyError(state)
+        return self.words[self.next_ids[self.sample(row)]]
+
+    def gen(self, init_state=None) -> Iterator[str]:
+        state = init_state or (BEGIN,) * self.state_size
+        row = self.state_row(state)
+        if row < 0:
+            raise KeyError(state)
+        while True:
+            i = self.sample(row)
+            if self.next_ids[i] == END_ID:
+                break
+            yield self.words[self.next_ids[i]]
+            row = self.next_rows[i]
+
+    def min_len_to_end(self, word_lens: Optional[Sequence[int]] = None) -> array:
+        # For each state (row), the length (in characters) of the shortest
+        # sequence of words that can follow it until the end of a sentence
+        # (i.e. words and their leading space, as joined by markovify.Text)
+        # -1 if there's none
+        # 'word_lens' is the length of each word (id) once joined, if it's not
+        # the length of the word (e.g. without a tag)
+        # Calculated backwards from the end (Dijkstra)
+        dist = array("i", [-1]) * len(self.states)
+
+        # Reverse graph: row => [(previous row, cost)]
+        previous = [[] for _ in range(len(self.states))]
+        heap = []
+
+        for row in range(len(self.states)):
+            for i in range(self.offsets[row], self.offsets[row + 1]):
+                if self.next_ids[i] == END_ID:
+                    dist[row] = 0
+                    heap.append((0, row))
+                elif self.next_rows[i] >= 0:
+                    word_id = self.next_ids[i]
+                    cost = 1 + (
+                        word_lens[word_id] if word_lens else len(self.words[word_id])
+                    )
+                    previous[self.next_rows[i]].append((row, cost))
+
+        heapq.heapify(heap)
+        while heap:
+            d, row = heapq.heappop(heap)
+            if d > dist[row]:
+                continue
+            for prev_row, cost in previous[row]:
+                prev_d = d + cost
+                if dist[prev_row] < 0 or prev_d < dist[prev_row]:
+                    dist[prev_row] = prev_d
+                    heapq.heappush(heap, (prev_d, prev_row))
+
+        return dist
+
+
+class CompactModel(Mapping):
+    # Read-only view of a CompactChain as markovify's Chain.model:
+    # { <state>: { <next word>: <count> } }, decoded on access
+
+    def __init__(self, chain: CompactChain):
+        self.chain = chain
+
+    def __getitem__(self, state: Tuple) -> Dict[str, int]:
+        return self.chain.next_words(state)
+
+    def __contains__(self, state) -> bool:
+        return self.chain.state_row(state) >= 0
+
+    def __iter__(self) -> Iterator[Tuple]:
+        return (self.chain.row_state(row) for row in range(len(self.chain.states)))
+
+    def __len__(self) -> int:
+        return len(self.chain.states)
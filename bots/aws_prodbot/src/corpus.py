@@ -0,0 +1,201 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+# Binary, columnar format of the products (same content as the JSON of
+# get.py), to memory-map and read fields of, without parsing the whole file:
+# only the values read are decoded (e.g. all the descriptions, but not the
+# abbreviations), and no dict is built per product.
+#
+# Layout (integers little-endian):
+#   magic                 8 bytes, MAGIC
+#   products, fields      2 x u32
+#   field names           per field: u16 length, UTF-8 name
+#                         (padded to a multiple of 8)
+#   offsets               per field: products + 1 x u64, position in the file
+#                         of each value, then of the end of the last one
+#   nulls                 per field: products x u8, 1 if the value is null
+#   values                UTF-8, per field, one after the other
+#
+# Files are replaced (not rewritten in place), so a file being read (mapped)
+# by a process doesn't change under it.
+
+# Usage: python corpus.py <file.json> <file.corpus> (or the other way around)
+
+MAGIC = b"AWSCORP1"
+HEADER = struct.Struct("<8sII")
+
+
+def is_corpus(filename: str) -> bool:
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write_corpus(items: List[Dict], filename: str) -> None:
+    # Products (same keys, in the same order, values str or None) to a file
+    fields = list(items[0]) if items else []
+    for item in items:
+        if list(item) != fields:
+            raise ValueError(f"Product with other fields than {fields}: {item}")
+
+    names = b"".join(
+        struct.pack("<H", len(f.encode("utf-8"))) + f.encode("utf-8") for f in fields
+    )
+    names += b"\0" * (-(HEADER.size + len(names)) % 8)
+    position = (
+        HEADER.size
+        + len(names)
+        + len(fields) * (len(items) + 1) * 8
+        + len(fields) * len(items)
+    )
+
+    offsets = array("Q")
+    nulls = bytearray()
+    values = []
+    for field in fields:
+        for item in items:
+            value = (item[field] or "").encode("utf-8")
+            offsets.append(position)
+            nulls.append(item[field] is None)
+            values.append(value)
+            position += len(value)
+        offsets.append(position)
+    if sys.byteorder != "little":
+        offsets.byteswap()
+
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(items), len(fields)))
+        f.write(names)
+        f.write(offsets.tobytes())
+        f.write(nulls)
+        f.write(b"".join(values))
+    os.replace(tmp_filename, filename)
+
+
+class Column(Sequence):
+    # Values of a field, decoded when read
+
+    def __init__(self, data: mmap.mmap, offsets: Sequence[int], nulls: memoryview):
+        self._data = data
+        self._offsets = offsets
+        self._nulls = nulls
+
+    def __len__(self) -> int:
+        return len(self._nulls)
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        if self._nulls[i]:
+            return None
+        return self._data[self._offsets[i] : self._offsets[i + 1]].decode("utf-8")
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        data, offsets, nulls = self._data, self._offsets, self._nulls
+        for i in range(len(nulls)):
+            if nulls[i]:
+                yield None
+            else:
+                yield data[offsets[i] : offsets[i + 1]].decode("utf-8")
+
+
+class Corpus(Sequence):
+    # Products of a corpus file, memory-mapped
+    # corpus.column("desc") has the descriptions, corpus[i] is a product
+    # (as in the JSON)
+
+    def __init__(self, filename: str):
+        with open(filename, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self._len, n_fields = HEADER.unpack_from(self._data)
+        if magic != MAGIC:
+            raise ValueError(f"{filename} isn't a corpus file")
+
+        position = HEADER.size
+        self.fields = []
+        for _ in range(n_fields):
+            (length,) = struct.unpack_from("<H", self._data, position)
+            name = self._data[position + 2 : position + 2 + length]
+            self.fields.append(name.decode("utf-8"))
+            position += 2 + length
+        position += -position % 8
+
+        view = memoryview(self._data)
+        offsets_size = (self._len + 1) * 8
+        self._columns = {}
+        nulls_position = position + n_fields * offsets_size
+        for i, field in enumerate(self.fields):
+            offsets = view[position : position + offsets_size]
+            if sys.byteorder == "little":
+                offsets = offsets.cast("Q")
+            else:
+                offsets = array("Q", offsets)
+                offsets.byteswap()
+            position += offsets_size
+            nulls = view[nulls_position : nulls_position + self._len]
+            nulls_position += self._len
+            self._columns[field] = Column(self._data, offsets, nulls)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, i: int) -> Dict:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return {field: self._columns[field][i] for field in self.fields}
+
+    def column(self, field: str) -> Column:
+        return self._columns[field]
+
+
+class JSONCorpus(Sequence):
+    # Same as Corpus, for products JSON files (parsed at once)
+
+    def __init__(self, filename: str):
+        with open(filename, "r") as f:
+            self._items = json.load(f)
+        self.fields = list(self._items[0]) if self._items else []
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, i: int) -> Dict:
+        return self._items[i]
+
+    def column(self, field: str) -> List[Optional[str]]:
+        return [item[field] for item in self._items]
+
+
+def open_corpus(filename: str) -> Union[Corpus, JSONCorpus]:
+    # Products of a file, either format
+    return Corpus(filename) if is_corpus(filename) else JSONCorpus(filename)
+
+
+def save_json(items: List[Dict], filename: str) -> None:
+    # As get.py saves them
+    with open(filename, "w") as f:
+        f.write(json.dumps(items, indent=2, separators=(",", ": "), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    # Converts either way, e.g. aws.json to aws.corpus
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python corpus.py <file.json> <file.corpus> (or the reverse)")
+    in_file, out_file = sys.argv[1:]
+
+    items = list(open_corpus(in_file))
+    if is_corpus(in_file):
+        save_json(items, out_file)
+    else:
+        write_corpus(items, out_file)
+    print(f"{len(items)} products from {in_file} saved to {out_file}")
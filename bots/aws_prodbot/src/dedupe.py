@@ -0,0 +1,277 @@
+import logging
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from hashlib import blake2b
+from itertools import repeat
+from operator import lshift, or_
+from typing import Iterable, List, Optional
+
+# Near-duplicate detection of texts (product names, descriptions), with
+# MinHash signatures indexed by LSH (locality-sensitive hashing):
+# * A text is the set of its shingles (runs of 'shingle_size' words), and the
+#   similarity of 2 texts is the Jaccard index of their sets
+# * Its signature is, for each of NUM_PERM hash functions, the min. hash of
+#   its shingles: the share of equal values between 2 signatures estimates
+#   their similarity. The hash functions are the 16-bit slices of one blake2b
+#   digest (of the shingle): a lot faster than NUM_PERM hashes, and
+#   16-bit values (vs. 64) cost a negligible bias for a quarter of the memory
+# * Signatures are indexed by BANDS bands of ROWS values: only the texts
+#   sharing a band with a candidate are compared to it, found by bisect in
+#   a sorted array of band keys (like compact.py's states). A lookup is
+#   ~log(n), i.e. stays well under 1ms with hundreds of thousands of texts
+# About 200 bytes per text indexed (signature and band keys)
+
+# Values per signature (at most 32: blake2b digests are 64 bytes at most),
+# and how they're banded (by 2, see band_keys())
+NUM_PERM = 32
+ROWS = 2
+BANDS = NUM_PERM // ROWS
+
+# Descriptions: runs of 3 words. Names: all their words (in any order) as
+# one shingle, i.e. only names of the same words match: they're too short
+# (and share too many words, e.g. "Amazon") for partial matches to mean much
+NAME_SHINGLE_SIZE = None
+DESC_SHINGLE_SIZE = 3
+
+# Estimated similarity from which texts are too similar
+NAME_THRESHOLD = 1.0
+DESC_THRESHOLD = 0.4
+
+# Band keys added before they're merged into the sorted ones, at least
+COMPACT_MIN = 4096
+
+# Records read at once from the history file
+READ_CHUNK = 4096
+
+# Band keys (4 bits of band number, 32 bits of values) are packed with the id
+# of their text in 64 bits, i.e. up to 2^28 texts
+ID_BITS = 28
+ID_MASK = (1 << ID_BITS) - 1
+
+WORD_RE = re.compile(r"\w+")
+
+log = logging.getLogger("root")
+
+
+def shingles(text: str, size: Optional[int]) -> set:
+    # Runs of 'size' words (lowercase), or all of them if fewer
+    # (or if no 'size', all of them, sorted)
+    words = WORD_RE.findall(text.lower())
+    if size is None:
+        return {" ".join(sorted(set(words)))} if words else set()
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def signature(text: str, size: Optional[int]) -> Optional[array]:
+    # MinHash signature of a text (see above), None if it has no words
+    hashes = [
+        array("H", blake2b(s.encode("utf-8"), digest_size=NUM_PERM * 2).digest())
+        for s in shingles(text, size)
+    ]
+    if not hashes:
+        return None
+    return array("H", map(min, zip(*hashes)))
+
+
+def band_keys(sig: array) -> List[int]:
+    # Keys of the bands of a signature: band number and its ROWS (2) 16-bit
+    # values, read as one 32-bit one
+    return [(band << 32) | v for band, v in enumerate(array("I", sig.tobytes()))]
+
+
+def similarity(sig: array, other: array) -> float:
+    # Estimated Jaccard index of the texts of 2 signatures
+    return sum(1 for a, b in zip(sig, other) if a == b) / NUM_PERM
+
+
+class MinHashIndex:
+    # Signatures of texts, to find the ones similar to a new text
+
+    def __init__(self, shingle_size: Optional[int], threshold: float):
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        # NUM_PERM values per text, by id (order added)
+        self.signatures = array("H")
+        # Band keys and the id of their text, packed as <key><id> (sorted),
+        # and the ones added since the last merge { <key>: [<id>, ...] },
+        # swapped at once
+        self._bands = (array("Q"), {})
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.signatures) // NUM_PERM
+
+    def signature(self, text: str) -> Optional[array]:
+        return signature(text, self.shingle_size)
+
+    def find(self, sig: Optional[array]) -> Optional[int]:
+        # Id of a text at least 'threshold' similar, if any
+        if sig is None:
+            return None
+        packed, pending = self._bands
+        signatures = self.signatures
+        seen = set()
+        for key in band_keys(sig):
+            lo = bisect_left(packed, key << ID_BITS)
+            hi = bisect_left(packed, (key + 1) << ID_BITS, lo)
+            candidates = [entry & ID_MASK for entry in packed[lo:hi]]
+            for i in candidates + pending.get(key, []):
+                if i in seen:
+                    continue
+                seen.add(i)
+                other = signatures[i * NUM_PERM : (i + 1) * NUM_PERM]
+                if similarity(sig, other) >= self.threshold:
+                    return i
+        return None
+
+    def add(self, sig: Optional[array]) -> None:
+        self.add_many([sig])
+
+    def add_many(self, sigs: Iterable[Optional[array]]) -> None:
+        with self._lock:
+            packed, pending = self._bands
+            first = len(self)
+            for sig in sigs:
+                if sig is not None:
+                    self.signatures.extend(sig)
+            added = len(self) - first
+
+            if added * BANDS + len(pending) > max(COMPACT_MIN, len(packed) // 4):
+                # Merge everything into the sorted keys
+                self._bands = (self._merged(packed, pending, first), {})
+            else:
+                for i in range(first, first + added):
+                    sig = self.signatures[i * NUM_PERM : (i + 1) * NUM_PERM]
+                    for key in band_keys(sig):
+                        pending.setdefault(key, []).append(i)
+
+    def _merged(self, packed: array, pending: dict, first: int) -> array:
+        # Sorted keys of 'packed', 'pending' and the texts from id 'first' on.
+        # The band number is their top bits: they're sorted band by band, so
+        # only a band's worth of them (1/BANDS) are Python ints at once (vs.
+        # all of them, e.g. ~500 MB for 300k posts)
+        pending_keys = [[] for _ in range(BANDS)]
+        for key, ids in pending.items():
+            pending_keys[key >> 32].extend((key << ID_BITS) | i for i in ids)
+
+        merged = array("Q")
+        lo = 0
+        # (Values of the new signatures, by 32 bits: one per band, not copied)
+        with memoryview(self.signatures) as view:
+            values = view[first * NUM_PERM :].cast("B").cast("I")
+            for band in range(BANDS):
+                hi = bisect_left(packed, (band + 1) << (32 + ID_BITS), lo)
+                keys = packed[lo:hi].tolist() + pending_keys[band]
+                # (i.e. (band << 32 | value) << ID_BITS | id, looped in C)
+                base = band << (32 + ID_BITS)
+                keys.extend(
+                    map(
+                        or_,
+                        map(lshift, values[band::BANDS], repeat(ID_BITS)),
+                        range(base + first, base + len(self)),
+                    )
+                )
+                keys.sort()
+                merged.fromlist(keys)
+                lo = hi
+            values.release()
+        return merged
+
+    def extend(self, texts: Iterable[str]) -> None:
+        self.add_many(self.signature(text) for text in texts)
+
+    def __getstate__(self):
+        # (Pickled in models, without the lock)
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class PostIndex:
+    # Names and descriptions (of posts, or source texts) to check new ones
+    # against, optionally persisted in 'filename': an append-only file of
+    # signatures, read back on creation
+
+    def __init__(self, filename: Optional[str] = None):
+        self.names = MinHashIndex(NAME_SHINGLE_SIZE, NAME_THRESHOLD)
+        self.descs = MinHashIndex(DESC_SHINGLE_SIZE, DESC_THRESHOLD)
+        self.filename = filename
+        self._lock = threading.Lock()
+        if filename:
+            self._load()
+
+    @classmethod
+    def from_texts(cls, names: Iterable[str], descs: Iterable[str]) -> "PostIndex":
+        index = cls()
+        index.names.extend(names)
+        index.descs.extend(descs)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def check(self, name: str, desc: str) -> Optional[str]:
+        # What's too similar to an indexed one ("name" or "desc"), if anything
+        if self.names.find(self.names.signature(name)) is not None:
+            return "name"
+        if self.descs.find(self.descs.signature(desc)) is not None:
+            return "desc"
+        return None
+
+    def add(self, name: str, desc: str) -> None:
+        name_sig = self.names.signature(name)
+        desc_sig = self.descs.signature(desc)
+        if name_sig is None or desc_sig is None:
+            return
+        with self._lock:
+            self.names.add(name_sig)
+            self.descs.add(desc_sig)
+            if self.filename:
+                with open(self.filename, "ab") as f:
+                    f.write(name_sig.tobytes() + desc_sig.tobytes())
+
+    def _load(self) -> None:
+        # Records: name then description signatures
+        if not os.path.exists(self.filename):
+            return
+        size = 2 * NUM_PERM * array("H").itemsize
+        length = os.path.getsize(self.filename)
+        # A truncated last record (e.g. from a crash) is dropped, not to
+        # misalign the next ones
+        if length % size:
+            log.warning(f"{self.filename}: truncated last record dropped")
+            length -= length % size
+            with open(self.filename, "r+b") as f:
+                f.truncate(length)
+        self.names.add_many(self._read(length, 0))
+        self.descs.add_many(self._read(length, 1))
+        log.info(f"{len(self)} posts indexed from {self.filename}")
+
+    def _read(self, length: int, field: int) -> Iterable[array]:
+        # Name (field 0) or description (1) signatures of the first 'length'
+        # bytes of records, read by chunks (not to hold them all)
+        size = 2 * NUM_PERM * array("H").itemsize
+        with open(self.filename, "rb") as f:
+            for start in range(0, length, READ_CHUNK * size):
+                records = array("H")
+                records.frombytes(f.read(min(READ_CHUNK * size, length - start)))
+                for i in range(field * NUM_PERM, len(records), 2 * NUM_PERM):
+                    yield records[i : i + NUM_PERM]
@@ -0,0 +1,15 @@
+import os
+
+# gunicorn settings (see the Dockerfile), i.e. gunicorn -c gunicorn.conf.py app:app
+# One process, so the models (and the post queue) are loaded once, with
+# threads to serve requests concurrently: generation only runs in the app's
+# bounded pool (GENERATE_WORKERS, see app.py), the other threads keep
+# /healthz and the rest responsive, and answer 429s when it's full
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = 1
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", default=16))
+
+# Long enough for a /generate of GENERATE_MAX_N products
+timeout = 120
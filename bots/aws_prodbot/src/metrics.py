@@ -0,0 +1,192 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, List, Sequence, Tuple
+
+# In-memory, Prometheus-style metrics (counters and histograms), exposed by
+# app.py's /metrics in the Prometheus text format, see:
+# https://prometheus.io/docs/instrumenting/exposition_formats/
+# Updating one is a lock and a few additions, so they're always on.
+# They're per process: stages run in model.py's worker processes
+# (i.e. --workers > 1) aren't counted.
+
+# Upper bounds (s) of the latency histograms' buckets
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+
+# Every metric, in order of creation
+registry = []
+
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    # e.g. '{stage="load_items"}'
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    # A count that only goes up, per set of label values
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # (Without labels, there's always a value, if only 0)
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels[n] for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels[n] for n in self.labelnames), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    # Counts of observations (e.g. durations) per bucket, with their sum,
+    # per set of label values
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # { <label values>: [<count per bucket (+Inf last)>, <sum>] }
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels[n] for n in self.labelnames)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [[0] * (len(self.buckets) + 1), 0]
+            counts[0][i] += 1
+            counts[1] += value
+
+    def count(self, **labels) -> int:
+        counts = self._values.get(tuple(labels[n] for n in self.labelnames))
+        return sum(counts[0]) if counts else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted((k, (list(c), s)) for k, (c, s) in self._values.items())
+        for key, (counts, total) in values:
+            # Buckets are cumulative
+            cumulative = 0
+            for le, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = _labels(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    # Every metric, in the Prometheus text format
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+# Stages (functions) of the bot, timed by span() or @timed()
+STAGE_SECONDS = Histogram(
+    "aws_prodbot_stage_seconds", "Time spent per stage.", ["stage"]
+)
+
+# Descriptions (see tweet.service_desc())
+DESC_ATTEMPTS = Counter(
+    "aws_prodbot_desc_attempts_total", "Start expressions tried for descriptions."
+)
+DESC_STEPS = Counter(
+    "aws_prodbot_desc_steps_total", "Chain transitions tried for descriptions."
+)
+DESC_REJECTIONS = Counter(
+    "aws_prodbot_desc_rejections_total",
+    "Transitions rejected while generating descriptions, per reason.",
+    ["reason"],
+)
+DESC_FAILURES = Counter(
+    "aws_prodbot_desc_failures_total", "Descriptions that couldn't be generated."
+)
+
+# Toots too similar to an existing product, or a past toot (see dedupe.py)
+DUPLICATES = Counter(
+    "aws_prodbot_duplicates_total",
+    "Toots not posted as too similar to a source text or a past toot, "
+    "per source (source, history) and part (name, desc).",
+    ["against", "part"],
+)
+
+# Posts (see poster.py)
+POSTS = Counter(
+    "aws_prodbot_posts_total", "Toots sent or given up on, per result.", ["result"]
+)
+POST_RETRIES = Counter(
+    "aws_prodbot_post_retries_total", "Toot attempts retried after an error."
+)
+
+# Requests rejected (429) as the generation pool was full (see pool.py)
+POOL_REJECTIONS = Counter(
+    "aws_prodbot_pool_rejections_total",
+    "Requests rejected as too many were generating or waiting to.",
+)
+
+# Pre-generated toots (see postqueue.py)
+POST_QUEUE_POPS = Counter(
+    "aws_prodbot_post_queue_pops_total",
+    "Toots taken from the queue (hit) or not, as it was empty (miss).",
+    ["result"],
+)
+POST_QUEUE_REJECTIONS = Counter(
+    "aws_prodbot_post_queue_rejections_total",
+    "Toots generated but not queued, per reason "
+    "(invalid: see tweet.generate_post(), duplicate: already queued or posted).",
+    ["reason"],
+)
+
+
+@contextmanager
+def span(stage: str):
+    # Time the block as 'stage' (see STAGE_SECONDS)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def timed(stage: str) -> Callable:
+    # Decorator, time every call as 'stage' (see STAGE_SECONDS)
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
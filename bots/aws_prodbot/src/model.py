@@ -0,0 +1,842 @@
+import argparse
+import gc
+import hashlib
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+import markovify
+
+import metrics
+from chain import TAG_SEP, ConstrainedText, POSifiedText
+from compact import CompactChain
+from corpus import open_corpus
+from dedupe import PostIndex
+
+# This module builds everything tweet.py derives from a products JSON
+# (see get.py) i.e. the tags dict, the name prefix/suffix frequencies and
+# the Markov chain, and saves/loads it as a single artifact so the expensive
+# NLP (tokenizing + tagging) only happens once, at build time.
+
+# nltk (slow to import, and its data slow to load) is only imported when
+# building a model, not to load a prebuilt one.
+if TYPE_CHECKING:
+    from nltk.probability import FreqDist
+
+# Usage: python model.py <products.json> <model file to save> [--full] [--workers <n>]
+
+# Version of the model artifact format.
+# Bump when the content of Model changes, so stale artifacts get rejected
+MODEL_VERSION = 8
+
+log = logging.getLogger("root")
+
+
+@dataclass
+class Model:
+    # Version of the artifact format (see MODEL_VERSION)
+    version: int
+    # sha256 of the products file the model was built from
+    source_sha256: str
+    # Existing product names
+    names: List[str]
+    # Words per nltk tag, e.g. { <tag>: [<word>, <word>]}
+    tags_dict: Dict
+    # Tables to generate product names from (see name_grammar())
+    name_grammar: "NameGrammar"
+    # Markov Chain model of the blurbs and descriptions
+    text_model: markovify.Text
+    # Constrained generator over text_model (see chain.py)
+    desc_model: ConstrainedText
+    # Same, over a chain of the words and their tags (see pos_text_model())
+    pos_desc_model: ConstrainedText
+    # Verbs (VBZ: present tense, 3rd person singular) descriptions can start
+    # with, i.e. that are in the chain (see start_verbs())
+    start_verbs: List[str]
+    # Existing names, blurbs and descriptions, not to post (near) copies of
+    # them (see dedupe.py)
+    sources: PostIndex
+
+
+@dataclass
+class NameGrammar:
+    # Everything tweet.service_name() picks name parts from
+    # Most common prefixes and suffixes of the existing product names
+    top_prefixes: List[str]
+    top_suffixes: List[str]
+    # Nouns (NN: singular or mass, NNP: proper singular) and verbs (VB: base)
+    nn: List[str]
+    nnp: List[str]
+    vb: List[str]
+    # Capital letters each prefix, noun and verb gives to an acronym (once
+    # title-cased), and each suffix gives (as is) see tweet.service_acronym()
+    # e.g. { "IoT": "I", "testcase": "T" }, { "API": "API" }
+    title_initials: Dict[str, str]
+    suffix_initials: Dict[str, str]
+
+
+def initials(text: str) -> str:
+    # Capital letters of a text, e.g. "ThisThat Thing" to "TTT"
+    return "".join(re.findall(r"[A-Z]", text))
+
+
+@metrics.timed("load_items")
+def load_items(filename: str) -> List[Dict]:
+    # Products of a products file, JSON or corpus (see corpus.py)
+    return list(open_corpus(filename))
+
+
+def file_sha256(filename: str) -> str:
+    with open(filename, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@metrics.timed("nltk_tags")
+def nltk_tags(text: str) -> List[Tuple[str, str]]:
+    # Calculate the nltk tags
+    # e.g. [(<word>, <tag>), ...]
+    import nltk
+
+    tokens = nltk.word_tokenize(text)
+    return nltk.pos_tag(tokens)
+
+
+@metrics.timed("nltk_tags_by_tag")
+def nltk_tags_by_tag(nltk_tags: List[Tuple[str, str]]) -> Dict:
+    # Tranform an nltk tags output into a dictionnary
+    # of word lists per tag
+    # e.g. [(<word>, <tag>), (<word>, <tag>), ...]
+    #  to: { <tag>: [<word>, <word>]}
+
+    # Words are collected as dict keys, to de-duplicate them
+    # while keeping their order
+    words_dict = defaultdict(dict)
+
+    for t in nltk_tags:
+        word, type = t
+
+        if word in ["amazon", "aws"]:
+            continue
+
+        words_dict[type][word.strip()] = None
+
+    return defaultdict(list, {type: list(words) for type, words in words_dict.items()})
+
+
+def name_fdists(names_list: List[str]) -> Tuple["FreqDist", "FreqDist"]:
+    # Extract the frequency of the prefixes and suffixes
+    # of the existing product names
+
+    # Remove AWS & Amazon
+    # Except at the end e.g. "<stuff> for AWS"
+    names_list = [re.sub(r"(AWS.)|(Amazon.)", "", n) for n in names_list]
+
+    # Remove things in parentheses
+    # e.g. '(SNS)', '(Preview)'
+    names_list = [re.sub(r" ?\([^)]+\)", "", n) for n in names_list]
+
+    # Add space before capital
+    # e.g. "CloudWatch" to "Cloud Watch"
+    # Only when the next letter isn't a capital, space or an 's' (plural, e.g. SDKs)
+    # so it doesn't split accronyums (e.g. 'EKS')
+    names_list_presplit = names_list.copy()
+    names_list = [re.sub(r"([A-Z][^A-Z\ss])", " \\1", n) for n in names_list]
+
+    # Clean up (remove extra staces (join(split)) and remove trail/lead spaces)
+    names_list = [" ".join(n.split()).strip() for n in names_list]
+    names_list_presplit = [" ".join(n.split()).strip() for n in names_list_presplit]
+
+    # Extract prefix and suffix terms
+    prefix_list = []
+    suffix_list = []
+    for n in names_list:
+        if re.search(r"\s", n):
+            tokens = n.split()
+            prefix_list.append(tokens[0])
+            suffix_list.append(tokens[-1])
+
+    for n in names_list_presplit:
+        if re.search(r"\s", n):
+            tokens = n.split()
+            prefix_list.append(tokens[0])
+
+    # Calculate frequency of prefix and suffix
+    from nltk.probability import FreqDist
+
+    prefix_fdist = FreqDist(prefix_list)
+    suffix_fdist = FreqDist(suffix_list)
+
+    return prefix_fdist, suffix_fdist
+
+
+def name_grammar(
+    prefix_fdist: "FreqDist", suffix_fdist: "FreqDist", tags_dict: Dict
+) -> NameGrammar:
+    # Name parts from the existing names prefixes and suffixes frequencies
+    # (see name_fdists()) and the words of the corpus (see nltk_tags_by_tag())
+
+    # Nouns
+    # NN: noun, singular or mass
+    # NNP: noun, proper, singular
+    # Keep nouns longer than 2 chars
+    nn = [i for i in tags_dict["NN"] if len(i) > 2]
+    nnp = [i for i in tags_dict["NNP"] if len(i) > 2]
+
+    # Remove common 'nouns' that have other than letters, numbers or dashes
+    nn = [i for i in nn if re.search(r"^[a-zA-Z0-9-]+$", i)]
+
+    # Verbs
+    # VB: verb, base form
+    # Keep verbs longer than 2 chars
+    vb = [i for i in tags_dict["VB"] if len(i) > 2]
+
+    # FreqDist.most_common gives returns
+    # [(<word>, <count>), (<word>, <count>), ...]
+    # in order of frequency, keep the most common words
+    # (nb: there's less really frequent suffixes)
+    top_prefixes = [w for w, _ in prefix_fdist.most_common(14)]
+    top_suffixes = [w for w, _ in suffix_fdist.most_common(13)]
+
+    log.debug(f"{top_prefixes=}")
+    log.debug(f"{top_suffixes=}")
+
+    return NameGrammar(
+        top_prefixes=top_prefixes,
+        top_suffixes=top_suffixes,
+        nn=nn,
+        nnp=nnp,
+        vb=vb,
+        title_initials={w: initials(w.title()) for w in top_prefixes + nn + vb},
+        suffix_initials={w: initials(w) for w in top_suffixes},
+    )
+
+
+def text_key(text: str) -> str:
+    # Key of a text in a tags cache
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def sentence_parser(state_size: int) -> markovify.Text:
+    # A markovify.Text only used to split texts into sentences of words
+    # (generate_corpus()), given a one-sentence chain not to build one
+    return markovify.Text(
+        None, state_size=state_size, chain=markovify.Chain([[]], state_size)
+    )
+
+
+def preprocess_shard(
+    texts: List[str], tagged_keys: set, state_size: int
+) -> Tuple[List[List[str]], Dict, Dict]:
+    # Preprocess a shard of the texts (see preprocess()), returns its
+    # * parsed sentences, as markovify.Text's parsed_sentences
+    # * chain counts, as markovify.Chain's model
+    # * tags of the texts not in 'tagged_keys', { <text key>: <nltk tags> }
+    sentences = list(sentence_parser(state_size).generate_corpus(texts))
+    counts = markovify.Chain(sentences, state_size).model if sentences else {}
+    tags = {}
+    for text in texts:
+        key = text_key(text)
+        if key not in tagged_keys and key not in tags:
+            tags[key] = nltk_tags(text)
+    return sentences, counts, tags
+
+
+def preprocess(
+    texts: List[str],
+    tags_cache: Dict,
+    prune_tags: bool = True,
+    workers: int = 1,
+    state_size: int = 2,
+) -> Tuple[List[Tuple[str, str]], markovify.Text]:
+    # nltk tags of the texts (one after the other) and the Markov chain model
+    # of their sentences (split text by text).
+    # Only the texts that aren't in 'tags_cache' already are tagged
+    # 'tags_cache' is updated and, if 'prune_tags', only keeps the entries of
+    # 'texts' (not to prune a cache shared by several corpora)
+    # With 'workers' > 1, the texts are sharded across a process pool, and
+    # the shards' results merged in order: whatever the number of workers,
+    # the result is the same.
+    tagged_keys = set(tags_cache)
+    # A few shards per worker, for an even load
+    shard_size = max(len(texts) // (workers * 4) if workers > 1 else len(texts), 1)
+    shards = [texts[i : i + shard_size] for i in range(0, len(texts), shard_size)]
+
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(
+                executor.map(
+                    preprocess_shard,
+                    shards,
+                    [tagged_keys] * len(shards),
+                    [state_size] * len(shards),
+                )
+            )
+    else:
+        results = [preprocess_shard(shard, tagged_keys, state_size) for shard in shards]
+
+    # Merge, in order (i.e. as if counted over all the sentences at once)
+    sentences = []
+    model = {}
+    for shard_sentences, shard_counts, shard_tags in results:
+        sentences += shard_sentences
+        for state, next_words in shard_counts.items():
+            counts = model.setdefault(state, {})
+            for word, count in next_words.items():
+                counts[word] = counts.get(word, 0) + count
+        tags_cache.update(shard_tags)
+
+    keys = [text_key(text) for text in texts]
+    tags = [tag for key in keys for tag in tags_cache[key]]
+    if prune_tags:
+        for key in set(tags_cache) - set(keys):
+            del tags_cache[key]
+
+    text_model = markovify.Text(
+        None,
+        state_size=state_size,
+        chain=markovify.Chain(None, state_size, model=model),
+        parsed_sentences=sentences,
+    )
+    return tags, text_model
+
+
+# A letter or digit
+ALNUM_RE = re.compile(r"[^\W_]")
+
+
+def tag_sentences(
+    text: str, tags: List[Tuple[str, str]], parser: markovify.Text
+) -> Optional[List[List[str]]]:
+    # Sentences of a text, split as 'parser' does (see sentence_parser()), with
+    # their words as "<word>::<tag>", from the text's nltk tags (see nltk_tags())
+    # A word made of several tokens (e.g. "EC2's", "(SNS)") gets the tag of the
+    # first one with a letter or digit, nltk's quotes (`` and '') match '"'
+    # None if the words and the tokens don't line up
+    tokens = iter(tags)
+    sentences = []
+    for sentence in parser.sentence_split(text):
+        words = []
+        for word in parser.word_split(sentence):
+            position = 0
+            tag = ""
+            tag_is_word = False
+            while position < len(word):
+                token, token_tag = next(tokens, (None, None))
+                if token is None:
+                    return None
+                if word.startswith(token, position):
+                    position += len(token)
+                elif token in ("``", "''") and word[position] == '"':
+                    position += 1
+                else:
+                    return None
+                if not tag_is_word:
+                    tag_is_word = ALNUM_RE.search(token) is not None
+                    if tag_is_word or not tag:
+                        tag = token_tag
+            words.append(f"{word}{TAG_SEP}{tag}")
+        if parser.test_sentence_input(sentence):
+            sentences.append(words)
+    return sentences
+
+
+def pos_text_model(
+    texts: List[str], tags_cache: Dict, text_model: markovify.Text
+) -> POSifiedText:
+    # Same chain as 'text_model' (of 'texts'), but of words and their tags
+    # (see chain.POSifiedText), from the tags of 'tags_cache' (i.e. nothing
+    # is tagged again). Texts whose tags don't line up with their words get
+    # the tags their words have elsewhere (or none)
+    parser = sentence_parser(text_model.state_size)
+    tagged = [tag_sentences(t, tags_cache[text_key(t)], parser) for t in texts]
+
+    word_tags = {}
+    if None in tagged:
+        log.debug(f"{tagged.count(None)} text(s) with misaligned tags")
+        for sentence in (s for sentences in tagged if sentences for s in sentences):
+            for w in sentence:
+                word, tag = w.rsplit(TAG_SEP, 1)
+                word_tags.setdefault(word, tag)
+
+    sentences = []
+    for text, text_sentences in zip(texts, tagged):
+        if text_sentences is None:
+            text_sentences = [
+                [f"{word}{TAG_SEP}{word_tags.get(word, '')}" for word in words]
+                for words in parser.generate_corpus([text])
+            ]
+        sentences += text_sentences
+
+    pos_model = POSifiedText(
+        None,
+        state_size=text_model.state_size,
+        chain=CompactChain.from_chain(
+            markovify.Chain(sentences, text_model.state_size)
+        ),
+        retain_original=False,
+    )
+    # The corpus, as generated sentences are checked against it: the same
+    # (untagged) text as text_model's, not kept twice
+    pos_model.rejoined_text = text_model.rejoined_text
+    return pos_model
+
+
+# Beginnings of the descriptions, besides verbs (see tweet.start_expression())
+START_EXPRESSIONS = ["is a", "is an"]
+
+
+def start_verbs(tags_dict: Dict, desc_models: List[ConstrainedText]) -> List[str]:
+    # Verbs of the corpus (VBZ) that descriptions can start with, as
+    # tweet.start_expression() does (lower case), i.e. that are in the chains
+    # The states to start from for them and START_EXPRESSIONS are indexed
+    # in the desc models (see ConstrainedText.index_beginnings())
+    verbs = list(dict.fromkeys(v.lower() for v in tags_dict["VBZ"]))
+    found = set(verbs)
+    for desc_model in desc_models:
+        found &= set(desc_model.index_beginnings(START_EXPRESSIONS + verbs))
+    return [v for v in verbs if v in found]
+
+
+def build_model(
+    aws_json_file: str,
+    tags_cache: Optional[Dict] = None,
+    prune_tags: bool = True,
+    workers: int = 1,
+) -> Model:
+    # Build the model from a products JSON file
+    # Texts already tagged in 'tags_cache' (see preprocess())
+    # aren't tagged again, e.g. to only tag the products that changed
+    # 'workers' processes do the tagging and chain building
+
+    # Load items (JSON, or only the fields used, if a corpus file)
+    with metrics.span("load_items"):
+        items = open_corpus(aws_json_file)
+
+        # Corpus: item blurbs and descriptions
+        blurbs = list(items.column("blurb"))
+        descs = list(items.column("desc"))
+
+    # Create nltk tags and the Markov chain model, per blurb/description
+    # 'state_size' defines how many words to look behind to guess the next
+    if tags_cache is None:
+        tags_cache = {}
+    tags, text_model = preprocess(blurbs + descs, tags_cache, prune_tags, workers)
+    tags_dict = nltk_tags_by_tag(tags)
+
+    # Item names
+    existing_names = list(items.column("name"))
+    prefix_fdist, suffix_fdist = name_fdists(existing_names)
+
+    # Same chain, a lot smaller (see compact.py)
+    text_model.chain = CompactChain.from_chain(text_model.chain)
+
+    # And of words and their tags, from the tags above
+    with metrics.span("pos_text_model"):
+        pos_model = pos_text_model(blurbs + descs, tags_cache, text_model)
+
+    desc_model = ConstrainedText(text_model)
+    # (Same corpus, same overlap index)
+    pos_desc_model = ConstrainedText(pos_model, desc_model.overlap)
+
+    return Model(
+        version=MODEL_VERSION,
+        source_sha256=file_sha256(aws_json_file),
+        names=existing_names,
+        tags_dict=tags_dict,
+        name_grammar=name_grammar(prefix_fdist, suffix_fdist, tags_dict),
+        text_model=text_model,
+        desc_model=desc_model,
+        pos_desc_model=pos_desc_model,
+        start_verbs=start_verbs(tags_dict, [desc_model, pos_desc_model]),
+        sources=PostIndex.from_texts(existing_names, blurbs + descs),
+    )
+
+
+def load_tags_cache(filename: str) -> Dict:
+    try:
+        with open(filename, "rb") as f:
+            return pickle.load(f)
+    except OSError:
+        return {}
+
+
+def save_tags_cache(tags_cache: Dict, filename: str) -> None:
+    with open(filename, "wb") as f:
+        pickle.dump(tags_cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def save_model(model: Model, filename: str) -> None:
+    with open(filename, "wb") as f:
+        pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_model(filename: str) -> Model:
+    with open(filename, "rb") as f:
+        model = pickle.load(f)
+
+    if getattr(model, "version", None) != MODEL_VERSION:
+        raise ValueError(
+            f"Model {filename} is version {getattr(model, 'version', None)}, "
+            f"expected {MODEL_VERSION}. Rebuild it with model.py"
+        )
+
+    return model
+
+
+def get_model(
+    aws_json_file: str, model_file: str = None, tags_cache: Optional[Dict] = None
+) -> Model:
+    # Load the prebuilt model if there's one and it was built from
+    # the same products file, otherwise build it (slow), only tagging the
+    # texts that aren't in 'tags_cache' (if empty: the prebuilt model's, if any)
+    # 'tags_cache' is updated, and not pruned (it can be shared)
+    if model_file:
+        try:
+            model = load_model(model_file)
+            if model.source_sha256 == file_sha256(aws_json_file):
+                return model
+            log.warning(f"Model {model_file} is stale for {aws_json_file}, rebuilding")
+        except (OSError, ValueError) as e:
+            log.warning(f"Can't load model {model_file} ({e}), rebuilding")
+
+    if tags_cache is None:
+        tags_cache = {}
+    if not tags_cache and model_file:
+        tags_cache.update(load_tags_cache(f"{model_file}.tags"))
+    return build_model(aws_json_file, tags_cache, prune_tags=False)
+
+
+# Model loads measured (see ModelCache._load()) one at a time
+_tracing_lock = threading.Lock()
+
+
+class ModelCache:
+    # Process-wide holder of the model of a products file, to be shared
+    # by all requests (and threads) of the app.
+    # The model is built (or loaded) once, then rebuilt in the background
+    # when the products file changes. Until the new one is ready, the previous
+    # model keeps being served, then it's swapped in at once.
+
+    def __init__(
+        self,
+        aws_json_file: str,
+        model_file: str = None,
+        check_interval: float = 30,
+        on_load: Optional[Callable[[Model], Model]] = None,
+        tags_cache: Optional[Dict] = None,
+        measure_size: bool = False,
+    ):
+        self.aws_json_file = aws_json_file
+        self.model_file = model_file
+        # Tags of the texts already tagged (see get_model()), kept across
+        # rebuilds so only what changed gets tagged again
+        self.tags_cache = tags_cache if tags_cache is not None else {}
+        # Minimum time (s) between two checks of the products file
+        self.check_interval = check_interval
+        # Called with every model built or loaded, before it's used
+        self.on_load = on_load
+        # Memory (bytes) the model takes, measured when it's built or loaded
+        # if 'measure_size' (see _load()), else None
+        self.measure_size = measure_size
+        self.size = None
+
+        self._model = None
+        # (mtime, size) of the products file the model was built from
+        self._stat = None
+        self._last_check = 0
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def _file_stat(self) -> Tuple[float, int]:
+        st = os.stat(self.aws_json_file)
+        return st.st_mtime, st.st_size
+
+    def get(self) -> Model:
+        model = self._model
+        if model is None:
+            # First use (or unloaded), nothing to serve: build in the foreground
+            with self._lock:
+                if self._model is None:
+                    stat = self._file_stat()
+                    self._model = self._load()
+                    self._stat = stat
+                    self._last_check = time.monotonic()
+                model = self._model
+        else:
+            self._check()
+
+        return model
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def unload(self) -> None:
+        # Forget the model (to free memory), the next get() builds it again
+        with self._lock:
+            self._model = None
+            self._stat = None
+
+    def _load(self) -> Model:
+        if not self.measure_size:
+            return self._get_model()
+
+        # What the build (or load) allocated and still holds, traced (so
+        # approx.: other threads' allocations meanwhile count too, and so do
+        # the texts it adds to 'tags_cache'). Tracing slows it down, and is
+        # process-wide: one at a time
+        with _tracing_lock:
+            tracing = tracemalloc.is_tracing()
+            if not tracing:
+                tracemalloc.start()
+            try:
+                before, _ = tracemalloc.get_traced_memory()
+                model = self._get_model()
+                gc.collect()
+                after, _ = tracemalloc.get_traced_memory()
+            finally:
+                if not tracing:
+                    tracemalloc.stop()
+        self.size = max(after - before, 0)
+        return model
+
+    def _get_model(self) -> Model:
+        model = get_model(self.aws_json_file, self.model_file, self.tags_cache)
+        if self.on_load:
+            model = self.on_load(model)
+        return model
+
+    def _check(self) -> None:
+        # Start a background rebuild if the products file changed
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+
+        with self._lock:
+            if self._rebuilding or now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+
+            try:
+                stat = self._file_stat()
+            except OSError as e:
+                log.warning(f"Can't stat {self.aws_json_file} ({e}), keeping model")
+                return
+
+            if stat == self._stat:
+                return
+
+            self._rebuilding = True
+
+        threading.Thread(target=self._rebuild, args=(stat,), daemon=True).start()
+
+    def _rebuild(self, stat: Tuple[float, int]) -> None:
+        try:
+            current = self._model
+            if current is None:
+                # Unloaded in the meantime, the next get() rebuilds it
+                return
+
+            # Only touched (e.g. re-copied), not changed
+            if file_sha256(self.aws_json_file) == current.source_sha256:
+                self._stat = stat
+                return
+
+            log.info(f"{self.aws_json_file} changed, rebuilding model")
+            model = self._load()
+
+            # Swap
+            self._model = model
+            self._stat = stat
+            log.info(f"Model rebuilt from {self.aws_json_file}")
+        except Exception:
+            log.exception(f"Can't rebuild model from {self.aws_json_file}")
+        finally:
+            self._rebuilding = False
+
+
+class SharedVocabulary:
+    # Canonical instances of the words of models, so that models of different
+    # corpora share the ones they have in common instead of each holding
+    # its own copies
+
+    def __init__(self):
+        self._objects = {}
+
+    def share(self, word: str) -> str:
+        # The canonical instance equal to 'word'
+        return self._objects.setdefault(word, word)
+
+    def share_model(self, model: Model) -> Model:
+        # Replace the words of a model by their canonical instances
+        share = self.share
+
+        model.names = [share(n) for n in model.names]
+        model.tags_dict = defaultdict(
+            list,
+            {tag: [share(w) for w in words] for tag, words in model.tags_dict.items()},
+        )
+        model.start_verbs = [share(w) for w in model.start_verbs]
+        grammar = model.name_grammar
+        grammar.nn = [share(w) for w in grammar.nn]
+        grammar.nnp = [share(w) for w in grammar.nnp]
+        grammar.vb = [share(w) for w in grammar.vb]
+
+        text_model = model.text_model
+        text_model.parsed_sentences = [
+            [share(w) for w in sentence] for sentence in text_model.parsed_sentences
+        ]
+
+        # Words of the chains (shared by the text models and desc models)
+        for chain in [text_model.chain, model.pos_desc_model.chain]:
+            chain.words = [share(w) for w in chain.words]
+            chain.word_ids = {w: i for i, w in enumerate(chain.words)}
+
+        return model
+
+
+class ModelRegistry:
+    # Models of several named corpora (products files), e.g. the current one
+    # and archived ones, each in its own ModelCache.
+    # Their words are shared (see SharedVocabulary), and when the
+    # models take more than 'max_mb' (as measured when they're loaded, see
+    # ModelCache._load()), the least recently used ones
+    # are unloaded (they'll be built again when needed).
+
+    def __init__(
+        self,
+        corpora: Dict[str, Tuple[str, Optional[str]]],
+        max_mb: float = 0,
+        check_interval: float = 30,
+    ):
+        # e.g. { <name>: (<products file>, <model file or None>) }
+        # The first one is the default
+        self.vocabulary = SharedVocabulary()
+        # Texts found in several corpora (e.g. products that didn't change
+        # between archives) are only tagged once. Only the corpora's texts
+        # are kept (see _prune_tags())
+        self.tags_cache = {}
+        self.caches = {
+            name: ModelCache(
+                aws_json_file,
+                model_file,
+                check_interval,
+                on_load=self._on_load,
+                tags_cache=self.tags_cache,
+                measure_size=bool(max_mb),
+            )
+            for name, (aws_json_file, model_file) in corpora.items()
+        }
+        self.default = next(iter(corpora))
+        self.max_bytes = max_mb * 1024 * 1024
+
+        # Names, least recently used first
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.caches)
+
+    def get(self, name: Optional[str] = None) -> Model:
+        # Model of a corpus (or the default one), KeyError if there's none
+        name = name or self.default
+        model = self.caches[name].get()
+
+        with self._lock:
+            self._lru[name] = True
+            self._lru.move_to_end(name)
+            if self.max_bytes:
+                self._evict(name)
+
+        return model
+
+    def _on_load(self, model: Model) -> Model:
+        # Every model built or loaded: its words shared, and 'tags_cache' pruned
+        model = self.vocabulary.share_model(model)
+        self._prune_tags()
+        return model
+
+    def _prune_tags(self) -> None:
+        # Only keep the tags of the texts of the corpora (loaded or not), i.e.
+        # drop the ones of products since changed: rebuilds only add to it
+        keys = set()
+        for cache in self.caches.values():
+            try:
+                items = open_corpus(cache.aws_json_file)
+                texts = list(items.column("blurb")) + list(items.column("desc"))
+            except (OSError, ValueError) as e:
+                log.warning(f"Can't read {cache.aws_json_file} ({e}), tags kept")
+                return
+            keys.update(text_key(text) for text in texts)
+
+        # (A copy of its keys: other models can be building meanwhile)
+        pruned = set(self.tags_cache) - keys
+        for key in pruned:
+            self.tags_cache.pop(key, None)
+        if pruned:
+            log.info(f"{len(pruned)} texts' tags pruned, {len(keys)} kept")
+
+    def _evict(self, name: str) -> None:
+        # Unload the least recently used models until under max_bytes,
+        # except the one in use ('name')
+        sizes = {
+            n: self.caches[n].size or 0
+            for n in self._lru
+            if n == name or self.caches[n].loaded
+        }
+
+        for n in list(self._lru):
+            if sum(sizes.values()) <= self.max_bytes:
+                break
+            if n == name or n not in sizes:
+                continue
+            log.info(f"Unloading model {n} ({sizes[n] / 1024 / 1024:.1f} MB)")
+            self.caches[n].unload()
+            del sizes[n]
+            del self._lru[n]
+
+
+if __name__ == "__main__":
+    # Usage: python model.py <products.json> <model file to save> [--workers <n>]
+    # Build through the importable module, so the pickled class
+    # is 'model.Model' and not '__main__.Model'
+    import model
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "aws_json_file", help="products JSON (or corpus) file (see get.py)"
+    )
+    parser.add_argument("model_file", help="model file to save")
+    parser.add_argument(
+        "--full", action="store_true", help="re-tag everything (see --tags-cache)"
+    )
+    parser.add_argument(
+        "--tags-cache",
+        help="tags of the previous build, to only tag what changed "
+        "(default: <model file>.tags)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="processes to tag and build the chain with (default: CPU count)",
+    )
+    args = parser.parse_args()
+
+    tags_cache_file = args.tags_cache or f"{args.model_file}.tags"
+    tags_cache = {} if args.full else model.load_tags_cache(tags_cache_file)
+    print(f"{len(tags_cache)} tagged texts from {tags_cache_file}")
+
+    m = model.build_model(args.aws_json_file, tags_cache, workers=args.workers)
+    model.save_model(m, args.model_file)
+    model.save_tags_cache(tags_cache, tags_cache_file)
+    print(f"Model saved to {args.model_file} (from {args.aws_json_file})")
@@ -0,0 +1,58 @@
+import bisect
+import zlib
+from array import array
+
+# Index of a corpus text (e.g. a markovify.Text's rejoined_text), to find
+# whether a run of words is in it (as markovify's originality test does,
+# with 'in') without searching the whole text every time.
+#
+# The text is words separated by single spaces, and so are the runs looked
+# up (e.g. "is a fully managed service"). A run found in the text can start
+# and end in the middle of words, but the words between its first and last
+# ones are whole words of the text (they're between spaces). So:
+# * every NGRAM words of the text are indexed by their crc32, with their
+#   position in the text: 'keys' has (crc32 << 32 | position), sorted
+# * a run is looked up by its 2nd to (NGRAM + 1)th words, and each position
+#   found is checked against the whole run (str.startswith())
+# i.e. the same answer as 'run in text', in time that depends on the run and
+# on how many times its words are in the text, not on the size of the text.
+# Runs of less than NGRAM + 2 words are searched for in the text.
+
+# Words per indexed n-gram
+NGRAM = 4
+
+
+class OverlapIndex:
+    def __init__(self, text: str):
+        self.text = text
+
+        # Position of each word of the text
+        starts = array("I", [0])
+        position = text.find(" ")
+        while position >= 0:
+            starts.append(position + 1)
+            position = text.find(" ", position + 1)
+
+        keys = array("Q")
+        for i in range(len(starts) - NGRAM):
+            ngram = text[starts[i] : starts[i + NGRAM] - 1]
+            keys.append(zlib.crc32(ngram.encode("utf-8")) << 32 | starts[i])
+        self.keys = array("Q", sorted(keys))
+
+    def __contains__(self, run: str) -> bool:
+        words = run.split(" ", NGRAM + 1)
+        if len(words) < NGRAM + 2:
+            return run in self.text
+
+        key = zlib.crc32(" ".join(words[1 : NGRAM + 1]).encode("utf-8")) << 32
+        # (The run starts that far before its 2nd word)
+        before = len(words[0]) + 1
+        text = self.text
+        keys = self.keys
+        for i in range(bisect.bisect_left(keys, key), len(keys)):
+            if keys[i] >> 32 != key >> 32:
+                break
+            start = (keys[i] & 0xFFFFFFFF) - before
+            if start >= 0 and text.startswith(run, start):
+                return True
+        return False
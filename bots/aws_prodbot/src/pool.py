@@ -0,0 +1,56 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable
+
+import metrics
+
+# Bounded pool for the CPU-heavy work of requests (i.e. generation):
+# * At most 'workers' requests generate at once, in the pool's threads, so
+#   the server's other threads (e.g. /healthz) keep being served
+# * At most 'max_pending' more wait for a worker. Past that, requests are
+#   rejected right away (PoolFull, i.e. a 429) instead of piling up
+# A request takes a slot (see slot()) then runs its work in the pool
+# (see run()), once or in chunks (e.g. to stream it).
+
+
+class PoolFull(Exception):
+    pass
+
+
+class BoundedPool:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="generate")
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def acquire(self) -> None:
+        # Take a slot, or raise PoolFull
+        if not self._slots.acquire(blocking=False):
+            metrics.POOL_REJECTIONS.inc()
+            raise PoolFull(f"{self.workers + self.max_pending} requests in progress")
+
+    def release(self) -> None:
+        self._slots.release()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def run(self, func: Callable, *args):
+        # func(*args) in a worker (waiting for one), with a slot taken
+        submitted = time.perf_counter()
+
+        def timed():
+            metrics.STAGE_SECONDS.observe(
+                time.perf_counter() - submitted, stage="pool_wait"
+            )
+            return func(*args)
+
+        return self._executor.submit(timed).result()
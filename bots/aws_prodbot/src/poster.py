@@ -0,0 +1,126 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+from typing import Optional
+
+from mastodon import (
+    Mastodon,
+    MastodonNetworkError,
+    MastodonRatelimitError,
+    MastodonServerError,
+)
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# Posting to Mastodon, off the request path
+# * One long-lived client (and keep-alive HTTP session) for all the posts
+# * Posts are queued and sent by a background thread, so callers (e.g. the
+#   Cloud Scheduler request to app.py) don't wait on the remote instance
+# * Transient errors (network, 5xx, rate limit) are retried with exponential
+#   backoff. Each post has an idempotency key, sent with every attempt, so
+#   a retry of a post that did go through isn't posted twice
+
+# Attempts per post, before giving up on it
+MAX_ATTEMPTS = 5
+
+# Backoff (s) before the 2nd attempt, doubled for each next one up to BACKOFF_MAX
+BACKOFF = 2
+BACKOFF_MAX = 60
+
+# Errors worth retrying
+RETRY_ERRORS = (MastodonNetworkError, MastodonServerError, MastodonRatelimitError)
+
+log = logging.getLogger("root")
+
+
+class Poster:
+    # Queue of posts to a Mastodon instance, sent in the background
+
+    def __init__(
+        self,
+        api_base_url: str,
+        access_token: str,
+        max_attempts: int = MAX_ATTEMPTS,
+        backoff: float = BACKOFF,
+        timeout: float = 30,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+
+        # Keep-alive connections, retries are done here (see send())
+        session = Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        self.mastodon = Mastodon(
+            access_token=access_token,
+            api_base_url=api_base_url,
+            session=session,
+            request_timeout=timeout,
+            ratelimit_method="throw",
+        )
+
+        # (text, idempotency key)
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def post(self, text: str, idempotency_key: Optional[str] = None) -> str:
+        # Queue a post, returns its idempotency key
+        # (given, to post something only once across calls, or generated)
+        idempotency_key = idempotency_key or uuid.uuid4().hex
+        self._start()
+        self.queue.put((text, idempotency_key))
+        log.debug(f"Toot queued ({idempotency_key}), {self.queue.qsize()} in queue")
+        return idempotency_key
+
+    def join(self) -> None:
+        # Wait until every queued post was sent (or given up on)
+        self.queue.join()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            text, idempotency_key = self.queue.get()
+            try:
+                self.send(text, idempotency_key)
+            except Exception as e:
+                log.error(f"Toot not sent ({idempotency_key}): {e!r}")
+                metrics.POSTS.inc(result="failed")
+            else:
+                metrics.POSTS.inc(result="sent")
+            finally:
+                self.queue.task_done()
+
+    def send(self, text: str, idempotency_key: str):
+        # Post now (in the calling thread), retrying transient errors
+        # Returns the Mastodon response, raises the last error
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                response = self.mastodon.status_post(
+                    text, idempotency_key=idempotency_key
+                )
+            except RETRY_ERRORS as e:
+                if attempt == self.max_attempts:
+                    raise
+                delay = min(self.backoff * 2 ** (attempt - 1), BACKOFF_MAX)
+                metrics.POST_RETRIES.inc()
+                log.warning(
+                    f"Toot attempt {attempt}/{self.max_attempts} failed "
+                    f"({idempotency_key}): {e!r}, retrying in {delay}s"
+                )
+                time.sleep(delay)
+            else:
+                log.debug(f"Toot sent ({idempotency_key}): {text}")
+                log.debug(f"Mastodon response: {response}")
+                return response
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+import metrics
+
+# Queue of pre-generated toots, ready to post, kept in a file
+# * A background thread keeps it topped up to 'depth' toots, so posting one
+#   is only popping it, however long generating it took
+# * Only toots that can be posted get in (see tweet.compose()), once: toots
+#   already queued or posted (the last 'history' ones) are skipped
+# * The file is rewritten (atomically) on every change, so the queue and
+#   what was posted survive restarts
+# Toots are {"text": <toot>, "key": <sha256 of the text>, ...}, the key is
+# also the idempotency key to post it with (see poster.py), and the rest is
+# what 'generate' gave with the text (e.g. the product it's of)
+
+# Toots to keep ready
+DEPTH = 10
+
+# Toots (their keys) remembered as queued or posted, to skip duplicates
+HISTORY = 1000
+
+# Toots generated per refill, per missing toot, before giving up until the next
+MAX_ATTEMPTS = 5
+
+# How often (s) to try to refill, besides every time a toot is popped
+REFILL_INTERVAL = 60
+
+log = logging.getLogger("root")
+
+
+def toot_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class PostQueue:
+    # Pre-generated toots, from 'generate' (returns {"text": <toot>, ...},
+    # or None)
+
+    def __init__(
+        self,
+        filename: str,
+        generate: Callable[[], Optional[Dict]],
+        depth: int = DEPTH,
+        history: int = HISTORY,
+    ):
+        self.filename = filename
+        self.generate = generate
+        self.depth = depth
+        self.history = history
+
+        self._toots = []
+        # Keys of the toots queued or posted, oldest first
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._toots)
+
+    def pop(self) -> Optional[Dict]:
+        # Oldest toot, None if the queue is empty
+        # (either way, the queue gets refilled in the background)
+        with self._lock:
+            toot = self._toots.pop(0) if self._toots else None
+            if toot:
+                self._save()
+        self._wake.set()
+        metrics.POST_QUEUE_POPS.inc(result="hit" if toot else "miss")
+        return toot
+
+    def add(self, toot: Optional[Dict]) -> bool:
+        # Queue a toot, if it can be posted and wasn't already
+        if not toot or not toot["text"]:
+            metrics.POST_QUEUE_REJECTIONS.inc(reason="invalid")
+            return False
+        key = toot_key(toot["text"])
+        with self._lock:
+            if key in self._seen:
+                metrics.POST_QUEUE_REJECTIONS.inc(reason="duplicate")
+                return False
+            self._toots.append({**toot, "key": key})
+            self._seen[key] = None
+            while len(self._seen) > max(self.history, len(self._toots)):
+                self._seen.popitem(last=False)
+            self._save()
+        return True
+
+    def refill(self) -> int:
+        # Generate toots until the queue is full (or too many attempts failed)
+        # Returns how many were added
+        added = 0
+        attempts = max(self.depth - len(self), 0) * MAX_ATTEMPTS
+        for _ in range(attempts):
+            if len(self) >= self.depth:
+                break
+            added += self.add(self.generate())
+        else:
+            if len(self) < self.depth:
+                log.warning(
+                    f"Post queue only has {len(self)}/{self.depth} toots "
+                    f"after {attempts} attempts"
+                )
+        return added
+
+    def start(self) -> None:
+        # Refill in the background, from now on
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                added = self.refill()
+                if added:
+                    log.info(f"Post queue refilled, {len(self)} toots ready")
+            except Exception:
+                log.exception("Post queue refill failed")
+            self._wake.wait(REFILL_INTERVAL)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning(f"Post queue {self.filename} ignored: {e!r}")
+            return
+        self._toots = data["toots"]
+        self._seen = OrderedDict.fromkeys(data["seen"])
+        log.info(f"Post queue loaded from {self.filename}, {len(self)} toots")
+
+    def _save(self) -> None:
+        # (With the lock held) write to a temp. file first, not to leave
+        # a half-written queue
+        tmp_filename = f"{self.filename}.tmp"
+        with open(tmp_filename, "w") as f:
+            json.dump({"toots": self._toots, "seen": list(self._seen)}, f)
+        os.replace(tmp_filename, self.filename)
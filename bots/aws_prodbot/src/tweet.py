@@ -1,3 +1,5 @@
+import argparse
+import functools
 import json
 import logging
 import logging.config
@@ -5,19 +7,37 @@ import os
 import random
 import re
 import sys
-from collections import defaultdict
-from itertools import groupby
-from typing import Dict, List, Tuple
+import time
+from itertools import accumulate, groupby
+from typing import Dict, Iterator, List, Optional, Tuple
 
-import markovify
-import nltk
-from mastodon import Mastodon
-from nltk import word_tokenize
-from nltk.probability import FreqDist
+import chain
+import dedupe
+import metrics
+import model
+import poster
 
 # Maximum message length
 MAX_LEN = 500
 
+# Maximum number of start expressions to try per description
+DESC_MAX_ATTEMPTS = 10
+
+# Names generated at once (see generate())
+NAME_BATCH = 100
+
+# Chains descriptions can be generated from (see desc_model()):
+# * words: of the words of the corpus
+# * pos: of its words and their part-of-speech tags, a word only follows what
+#   it followed as the same part of speech (see chain.POSifiedText)
+DESC_MODES = ("words", "pos")
+
+# Descriptions can't contain this (see service_desc())
+DESC_REJECT_RE = re.compile(r"is an? (AWS|Amazon)")
+
+# Log level, e.g. DEBUG for every step of the generation
+LOG_LEVEL = os.environ.get("LOG_LEVEL", default="INFO")
+
 # Logger settings
 LOGGER_SETTINGS = {
     "version": 1,
@@ -27,7 +47,7 @@ LOGGER_SETTINGS = {
         }
     },
     "handlers": {"console": {"class": "logging.StreamHandler", "formatter": "default"}},
-    "loggers": {"root": {"handlers": ["console"], "level": "DEBUG"}},
+    "loggers": {"root": {"handlers": ["console"], "level": LOG_LEVEL}},
 }
 
 # Logger
@@ -60,115 +80,111 @@ else:
             "Check Mastodon env. vars: MASTODON_API_URL, MASTODON_ACCESS_TOKEN"
         )
 
+    # Mastodon client and posting queue, shared by all toots
+    mastodon_poster = poster.Poster(MASTODON_API_URL, MASTODON_ACCESS_TOKEN)
 
-def load_items(filename: str) -> List[Dict]:
-    with open(filename, "r") as f:
-        return json.load(f)
-
-
-def nltk_tags(text: str) -> List[Tuple[str, str]]:
-    # Calculate the nltk tags
-    # e.g. [(<word>, <tag>), ...]
-    tokens = word_tokenize(text)
-    return nltk.pos_tag(tokens)
-
-
-def nltk_tags_by_tag(nltk_tags: List[Tuple[str, str]]) -> Dict:
-    # Tranform an nltk tags output into a dictionnary
-    # of word lists per tag
-    # e.g. [(<word>, <tag>), (<word>, <tag>), ...]
-    #  to: { <tag>: [<word>, <word>]}
-
-    words_dict = defaultdict(list)
-
-    for t in nltk_tags:
-        word, type = t
-
-        if word in ["amazon", "aws"]:
-            continue
-        if word in words_dict[type]:
-            continue
-
-        words_dict[type].append(word.strip())
-
-    return words_dict
 
-
-def start_expression(verbs: List) -> str:
+def start_expression(verbs: List, rng: random.Random = random) -> str:
     # Generate the start of service description (after the name),
     # to ease Markov Chains completion
-    # i.e. is a|is an|<a verb>
-    exps = ["is a", "is an", random.choice(verbs).lower()]
+    # i.e. is a|is an|<a verb> (only verbs that are in the chain, so that
+    # every start expression has states to start from, see model.start_verbs())
+    exps = ["is a", "is an", rng.choice(verbs).lower()]
     exps_weights = [40, 20, 40]
-    return random.choices(population=exps, weights=exps_weights)[0]
+    return rng.choices(population=exps, weights=exps_weights)[0]
 
 
-class POSifiedText(markovify.Text):
-    # Class to use nltk's tagging and word split
-    def word_split(self, sentence):
-        words = re.split(self.word_split_pattern, sentence)
-        words = ["::".join(tag) for tag in nltk.pos_tag(words)]
-        return words
+@metrics.timed("service_desc")
+def service_desc(
+    desc_model: chain.ConstrainedText,
+    verbs: List[str],
+    max_len: int,
+    stats: Optional[Dict] = None,
+    rng: random.Random = random,
+):
+    # Generate a service name using Markov Chains
+    # Uses the (prebuilt) corpus text model, the verbs it can start with
+    # (see model.start_verbs()) and specifies a max length
+    # 'stats' (if given) is updated with the number of 'attempts' (start
+    # expressions tried) and 'steps' (chain transitions tried) it took, and
+    # the 'rejections' per reason (see chain.REJECTIONS), also counted in metrics
+    # All random draws are from 'rng', e.g. a seeded random.Random()
+
+    # This call's
+    run_stats = {"attempts": 0, "steps": 0}
+    debug = log.isEnabledFor(logging.DEBUG)
+
+    # Try a few start expressions, for each the sentence is generated with the
+    # logic of 'make_short_sentence()' built in (see chain.ConstrainedText)
+    # so each attempt does a bounded amount of work
+    for i in range(DESC_MAX_ATTEMPTS):
+        run_stats["attempts"] += 1
+        sentence = desc_model.make_sentence_with_start(
+            beginning=start_expression(verbs, rng),
+            max_len=max_len,
+            min_words=20,
+            # Skip if the sentence matches "is a/an <aws product>", which
+            # typically makes the sentence go off in another, grammatically
+            # incorrect, direction. e.g. "<a> is a <b> is a ..."
+            reject=DESC_REJECT_RE,
+            rng=rng,
+            stats=run_stats,
+        )
 
-    def word_join(self, words):
-        sentence = " ".join(word.split("::")[0] for word in words)
-        return sentence
+        if debug:
+            log.debug(f"Run #{i}, {max_len=}, {run_stats=}, {sentence=}")
 
+        if sentence:
+            break
+    else:
+        log.warning(f"No description generated, {run_stats=}")
+        metrics.DESC_FAILURES.inc()
 
-def service_desc(corpus: str, tags_dict: Dict, max_len: int):
-    # Generate a service name using Markov Chains
-    # Uses the whole corpus text, tags dict and specifies a max length
-
-    # 'state_size' defines how many words to look behind to guess the next
-    # text_model = POSifiedText(corpus, state_size=2)
-    text_model = markovify.Text(corpus, state_size=2)
-
-    # VBZ: verb, present tense, 3rd person singular
-    verbs = tags_dict["VBZ"]
-
-    # Retry many times to make sure a sentence with start is generated
-    # Also implement the logic of 'make_short_sentence()'
-    for i in range(0, 100):
-        try:
-            # sentence = text_model.make_sentence()
-            sentence = text_model.make_sentence_with_start(
-                beginning=start_expression(verbs), strict=False, min_words=20
-            )
+    metrics.DESC_ATTEMPTS.inc(run_stats["attempts"])
+    metrics.DESC_STEPS.inc(run_stats["steps"])
+    for reason, count in run_stats["rejections"].items():
+        if count:
+            metrics.DESC_REJECTIONS.inc(count, reason=reason)
 
-            log.debug(f"Run #{i}, {max_len=} {len(sentence)=}, {sentence=}")
+    if stats is not None:
+        stats["attempts"] = stats.get("attempts", 0) + run_stats["attempts"]
+        stats["steps"] = stats.get("steps", 0) + run_stats["steps"]
+        rejections = stats.setdefault("rejections", {})
+        for reason, count in run_stats["rejections"].items():
+            rejections[reason] = rejections.get(reason, 0) + count
 
-            if len(sentence) >= max_len:
-                # Skip if too long
-                continue
-            elif re.search(r"is an? (AWS|Amazon)", sentence):
-                # Skip if the sentence matches "is a/an <aws product>", which
-                # typically makes the sentence go off in another, grammatically
-                # incorrect, direction. e.g. "<a> is a <b> is a ..."
-                continue
-            else:
-                return sentence
+    return sentence
 
-        except markovify.text.ParamError:
-            continue
-        break
+
+def desc_model(m: model.Model, mode: str = "words") -> chain.ConstrainedText:
+    # Description generator of a model, per mode (see DESC_MODES)
+    if mode not in DESC_MODES:
+        raise ValueError(f"Unknown mode {mode}, must be one of: {DESC_MODES}")
+    return m.pos_desc_model if mode == "pos" else m.desc_model
 
 
 def service_acronym(name: str) -> str:
     # For example 'EC2' for 'Elastic Compute Cloud'
 
-    # Capital letters as list
-    # e.g. "ThisThat Thing" to ['T', 'T', 'T']
-    initials_list = re.findall(r"[A-Z]", name)
+    # Capital letters
+    # e.g. "ThisThat Thing" to "TTT"
+    return initials_acronym(model.initials(name))
+
+
+@functools.lru_cache(maxsize=4096)
+def initials_acronym(initials: str) -> str:
+    # Acronym from the capital letters of a name, see service_acronym()
+    # (cached, names have a limited number of combinations of initials)
 
     # Don't create an acronym if two letters or less.
-    if len(initials_list) <= 2:
+    if len(initials) <= 2:
         return ""
 
     # Count consecutive letters
     # https://stackoverflow.com/a/13211561
-    # e.g. ['T', 'T', 'A']
+    # e.g. "TTA"
     #  to: [['T', 2], ['A', 1]]
-    letter_groups = [[k, len(list(g))] for k, g in groupby(initials_list)]
+    letter_groups = [[k, len(list(g))] for k, g in groupby(initials)]
 
     # Transform the above list, for each item:
     # <letter><number> if number > 1
@@ -188,86 +204,17 @@ def service_acronym(name: str) -> str:
         return acronym
 
 
-def service_name(names_list, tags_dict):
+@metrics.timed("service_name")
+def service_name(grammar: model.NameGrammar, rng: random.Random = random):
     # Generate a service name w/ already existing nouns and words
     # Uses statistics and frequence of usage of some existing words
-    # and some AWS service name formats
-
-    # Nouns
-    # NN: noun, singular or mass
-    # NNP: noun, proper, singular
-    # NNS: noun, common, plural
-    nn = tags_dict["NN"]
-    nnp = tags_dict["NNP"]
-    nns = tags_dict["NNS"]
-
-    # Keep nouns longer than 2 chars
-    nn = [i for i in nn if len(i) > 2]
-    nnp = [i for i in nnp if len(i) > 2]
-
-    # Remove common 'nouns' that have other than letters, numbers or dashes
-    nn = [i for i in nn if re.search(r"^[a-zA-Z0-9-]+$", i)]
-
-    # Verbs
-    # VB: verb, base form
-    vb = tags_dict["VB"]
-
-    # Keep verbs longer than 2 chars
-    vb = [i for i in vb if len(i) > 2]
-
-    # Extract info from existing names
-
-    # Remove AWS & Amazon
-    # Except at the end e.g. "<stuff> for AWS"
-    names_list = [re.sub(r"(AWS.)|(Amazon.)", "", n) for n in names_list]
-
-    # Remove things in parentheses
-    # e.g. '(SNS)', '(Preview)'
-    names_list = [re.sub(r" ?\([^)]+\)", "", n) for n in names_list]
-
-    # Add space before capital
-    # e.g. "CloudWatch" to "Cloud Watch"
-    # Only when the next letter isn't a capital, space or an 's' (plural, e.g. SDKs)
-    # so it doesn't split accronyums (e.g. 'EKS')
-    names_list_presplit = names_list.copy()
-    names_list = [re.sub(r"([A-Z][^A-Z\ss])", " \\1", n) for n in names_list]
-
-    # Clean up (remove extra staces (join(split)) and remove trail/lead spaces)
-    names_list = [" ".join(n.split()).strip() for n in names_list]
-    names_list_presplit = [" ".join(n.split()).strip() for n in names_list_presplit]
-
-    # Extract prefix and suffix terms
-    prefix_list = []
-    suffix_list = []
-    for n in names_list:
-        if re.search(r"\s", n):
-            tokens = n.split()
-            prefix_list.append(tokens[0])
-            suffix_list.append(tokens[-1])
-
-    for n in names_list_presplit:
-        if re.search(r"\s", n):
-            tokens = n.split()
-            prefix_list.append(tokens[0])
-
-    # print(names_list)
-
-    # Calculate frequency of prefix and suffix
-    prefix_fdist = FreqDist(prefix_list)
-    suffix_fdist = FreqDist(suffix_list)
-
-    # FreqDist.most_common gives returns
-    # [(<word>, <count>), (<word>, <count>), ...]
-    # in order of frequency, keep the most common words
-    # (nb: there's less really frequent suffixes)
-    top_prefixes, _ = zip(*prefix_fdist.most_common(14))
-    top_suffixes, _ = zip(*suffix_fdist.most_common(13))
-
-    top_prefixes = list(top_prefixes)
-    top_suffixes = list(top_suffixes)
-
-    print(f"{top_prefixes=}")
-    print(f"{top_suffixes=}")
+    # (prefixes and suffixes of existing names) and some AWS service name
+    # formats, all precomputed per corpus (see model.name_grammar())
+    nn = grammar.nn
+    nnp = grammar.nnp
+    vb = grammar.vb
+    top_prefixes = grammar.top_prefixes
+    top_suffixes = grammar.top_suffixes
 
     """
     Service names examples:
@@ -282,39 +229,39 @@ def service_name(names_list, tags_dict):
     # Name components
 
     # Brand: AWS or Amazon
-    brand = random.choice(["AWS", "Amazon"])
+    brand = rng.choice(["AWS", "Amazon"])
 
     # Prefix
     prefix_exps = [
         "",  # No prefix
-        random.choice(top_prefixes),  # Top prefixes from existing products
+        rng.choice(top_prefixes),  # Top prefixes from existing products
     ]
     prefix_weights = [
         10,
         50,
     ]
-    prefix = random.choices(prefix_exps, prefix_weights)[0]
+    prefix = rng.choices(prefix_exps, prefix_weights)[0]
 
     # 'Middle name'
     # e.g. "ThisThat", "Thisthat", "This That", "This", "That"
     middle_name_exps_a = [
         "",  # Nothing
-        random.choice(nn),  # Alredy used nouns
-        random.choice(vb),  # Alredy used infinitive verbs
+        rng.choice(nn),  # Alredy used nouns
+        rng.choice(vb),  # Alredy used infinitive verbs
     ]
     middle_name_exps_b = [
         "",  # Nothing
-        random.choice(nn),  # Alredy used nouns
-        random.choice(vb),  # Alredy used infinitive verbs
+        rng.choice(nn),  # Alredy used nouns
+        rng.choice(vb),  # Alredy used infinitive verbs
     ]
 
     middle_name_weight_a = [10, 70, 20]
     middle_name_weight_b = [10, 20, 70]
 
-    middle_name_a = random.choices(middle_name_exps_a, middle_name_weight_a)[0]
-    middle_name_b = random.choices(middle_name_exps_b, middle_name_weight_b)[0]
+    middle_name_a = rng.choices(middle_name_exps_a, middle_name_weight_a)[0]
+    middle_name_b = rng.choices(middle_name_exps_b, middle_name_weight_b)[0]
 
-    middle_name = random.choice(
+    middle_name = rng.choice(
         [
             _capitalize(f"{middle_name_a}{middle_name_b}"),
             f"{_capitalize(middle_name_a)}{_capitalize(middle_name_b)}",
@@ -325,44 +272,46 @@ def service_name(names_list, tags_dict):
     # Suffix
     suffix_exps = [
         "",  # No prefix
-        random.choice(top_suffixes),  # Top suffixes from existing products
+        rng.choice(top_suffixes),  # Top suffixes from existing products
     ]
     suffix_weights = [
         60,
         40,
     ]
-    suffix = random.choices(suffix_exps, suffix_weights)[0]
+    suffix = rng.choices(suffix_exps, suffix_weights)[0]
 
     # acronym
-    acronym_str = " ".join(
-        # Do a title() on the seperate expressions only for the acronym, so:
-        # * capitals in the middle of words don't count (e.g. IoT, API)
-        prefix.title()
-        # * fused words still get their accronyms (e.g. 'Testcase' is 'TC')
-        + f"{middle_name_a} {middle_name_b}".title()
-        + suffix
+    # Capitals of the prefix and middle name once title()'d (suffix as is), so:
+    # * capitals in the middle of words don't count (e.g. IoT, API)
+    # * fused words still get their accronyms (e.g. 'Testcase' is 'TC')
+    title_initials = grammar.title_initials
+    acronym_initials = (
+        title_initials.get(prefix, "")
+        + title_initials.get(middle_name_a, "")
+        + title_initials.get(middle_name_b, "")
+        + grammar.suffix_initials.get(suffix, "")
     )
     acronym_exps = [
         "",  # No acronym
-        service_acronym(acronym_str),
+        initials_acronym(acronym_initials),
     ]
     acronym_weights = [
         10,
         90,
     ]
-    acronym = random.choices(acronym_exps, acronym_weights)[0]
+    acronym = rng.choices(acronym_exps, acronym_weights)[0]
 
     # Purpose
     # e.g. "for <something>"
     purpose_exps = [
         "",  # No prefix
-        f"for {random.choice(nnp)}",  # Top prefixes from existing products
+        f"for {rng.choice(nnp)}",  # Top prefixes from existing products
     ]
     purpose_weights = [
         90,
         10,
     ]
-    purpose = random.choices(purpose_exps, purpose_weights)[0]
+    purpose = rng.choices(purpose_exps, purpose_weights)[0]
 
     # Build the name
     name = []
@@ -374,16 +323,12 @@ def service_name(names_list, tags_dict):
         name.append(f"({acronym})")
     name.append(purpose)
 
-    log.debug(f"{name=}")
     # Clean (strip and remove empty tokens)
     name = [n.strip() for n in name if len(n) > 0]
 
     # Join into a single string
     name_str = " ".join(name)
 
-    log.debug(f"{name=}")
-    log.debug(f"{len(name_str)=}, {name_str=}")
-
     # Build abbreviation, if an accronym exists
     abbrev = []
     if acronym:
@@ -391,19 +336,104 @@ def service_name(names_list, tags_dict):
         abbrev.append(acronym)
         abbrev.append(purpose)
 
-    log.debug(f"{abbrev=}")
     # Clean (strip and remove empty tokens)
     abbrev = [n.strip() for n in abbrev if len(n) > 0]
 
     # Join into a single string
     abbrev_str = " ".join(abbrev)
 
-    log.debug(f"{abbrev=}")
-    log.debug(f"{len(abbrev)=}, {abbrev=}")
+    # (Not to format them for nothing, it's called for every product)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(f"{name=}, {len(name_str)=}, {name_str=}")
+        log.debug(f"{abbrev=}, {len(abbrev_str)=}, {abbrev_str=}")
 
     return name_str, abbrev_str
 
 
+def _weighted(
+    weight_empty: float, pools: List[Tuple[List[str], float]]
+) -> Tuple[List[str], List[float]]:
+    # Population and cumulative weights to draw "" or a word of one of the
+    # pools, in one draw, with the same odds as drawing "" or a pool
+    # (with their weights) then a word of it, e.g. "" or rng.choice(nn)
+    population = [""]
+    weights = [weight_empty]
+    for pool, weight in pools:
+        if not pool:
+            continue
+        population += pool
+        weights += [weight / len(pool)] * len(pool)
+    return population, list(accumulate(weights))
+
+
+@metrics.timed("service_names")
+def service_names(
+    grammar: model.NameGrammar, n: int, rng: random.Random = random
+) -> List[Tuple[str, str]]:
+    # Generate <n> service names (and abbreviations) at once, with the same
+    # parts and odds as service_name(), but each part is drawn for all the
+    # names in one call (rng.choices(k=n)), only when it's used (e.g. the
+    # noun of a purpose), and acronyms are made from the initials
+    # precomputed per word (see model.name_grammar())
+    def draw(population, cum_weights=None, k=n):
+        return rng.choices(population, cum_weights=cum_weights, k=k)
+
+    # (Weights as in service_name(), cumulative for the last two)
+    brands = draw(["AWS", "Amazon"])
+    prefixes = draw(*_weighted(10, [(grammar.top_prefixes, 50)]))
+    middle_names_a = draw(*_weighted(10, [(grammar.nn, 70), (grammar.vb, 20)]))
+    middle_names_b = draw(*_weighted(10, [(grammar.nn, 20), (grammar.vb, 70)]))
+    middle_name_forms = draw(range(3))
+    suffixes = draw(*_weighted(60, [(grammar.top_suffixes, 40)]))
+    with_acronyms = draw([False, True], [10, 10 + 90])
+    with_purposes = draw([False, True], [90, 90 + 10])
+    purposes = iter(draw(grammar.nnp, k=with_purposes.count(True)))
+
+    title_initials = grammar.title_initials
+    suffix_initials = grammar.suffix_initials
+
+    names = []
+    for i in range(n):
+        brand, prefix, suffix = brands[i], prefixes[i], suffixes[i]
+        middle_name_a, middle_name_b = middle_names_a[i], middle_names_b[i]
+
+        form = middle_name_forms[i]
+        if form == 0:
+            middle_name = _capitalize(f"{middle_name_a}{middle_name_b}")
+        elif form == 1:
+            middle_name = f"{_capitalize(middle_name_a)}{_capitalize(middle_name_b)}"
+        else:
+            middle_name = f"{_capitalize(middle_name_a)} {_capitalize(middle_name_b)}"
+
+        acronym = ""
+        if with_acronyms[i]:
+            acronym_initials = (
+                title_initials.get(prefix, "")
+                + title_initials.get(middle_name_a, "")
+                + title_initials.get(middle_name_b, "")
+                + suffix_initials.get(suffix, "")
+            )
+            acronym = initials_acronym(acronym_initials)
+
+        purpose = f"for {next(purposes)}" if with_purposes[i] else ""
+
+        # As service_name() builds them
+        name = [brand, prefix, middle_name, suffix]
+        if acronym:
+            name.append(f"({acronym})")
+        name.append(purpose)
+        name_str = " ".join(p for p in (part.strip() for part in name) if p)
+
+        abbrev_str = ""
+        if acronym:
+            abbrev = [brand, acronym, purpose]
+            abbrev_str = " ".join(p for p in (part.strip() for part in abbrev) if p)
+
+        names.append((name_str, abbrev_str))
+
+    return names
+
+
 def _capitalize(str):
     # Like str.capitlize() but only changes the first letter
     if len(str) == 0:
@@ -422,50 +452,65 @@ def toot_intro(name: str, abbrev: str) -> str:
         line2 = f"{name}"
 
     toot_intro = f"{line1}\n\n{line2}"
-    log.debug(f"{len(toot_intro)=}, {toot_intro=}")
+    # (Not to format it for nothing, it's called for every product)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(f"{len(toot_intro)=}, {toot_intro=}")
     return toot_intro
 
 
-def send_toot(toot: str) -> None:
-    log.debug(f"{len(toot)=}, {toot=}")
+def compose(product: Dict) -> Optional[str]:
+    # The toot of a product (see generate()), None if it can't be posted
+    # (no description could be generated, or too long)
+    if not product["desc"]:
+        return None
+    toot = f"{toot_intro(product['name'], product['abbrev'])} {product['desc']}"
+    if len(toot) > MAX_LEN:
+        return None
+    return toot
+
+
+@metrics.timed("send_toot")
+def send_toot(toot: str, idempotency_key: Optional[str] = None) -> None:
+    # Queue the toot, it's sent in the background (see poster.py)
+    # 'idempotency_key' (if given) makes sure it's posted only once
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(f"{len(toot)=}, {toot=}")
 
     if DISABLE_TOOT:
         return
 
-    # Create Mastodon API object
-    mastodon = Mastodon(
-        access_token=MASTODON_ACCESS_TOKEN, api_base_url=MASTODON_API_URL
-    )
-
-    # Send toot
-    toot_response = mastodon.status_post(toot)
-    log.debug(f"Toot sent: {toot}")
-    log.debug(f"Madtodon response: {toot_response}")
+    mastodon_poster.post(toot, idempotency_key)
 
 
 def update_mastodon_bio():
     pass
 
 
-def main(aws_json_file):
-    # Load items (json)
-    items = load_items(aws_json_file)
-
-    # Create corpus from item blurbs and descriptions
-    blurbs = [i["blurb"] for i in items]
-    descs = [i["desc"] for i in items]
-    corpus = " ".join(blurbs + descs)
-
-    # Create nltk tags from corpus
-    tags = nltk_tags(corpus)
-    tags_dict = nltk_tags_by_tag(tags)
-
-    # Item names
-    existing_names = [i["name"] for i in items]
-
-    for _ in range(1):
+def generate(
+    m: model.Model,
+    n: int = 1,
+    rng: random.Random = random,
+    stats: Optional[List[Dict]] = None,
+    mode: str = "words",
+) -> Iterator[Dict]:
+    # Generate <n> product announcements from a model, one at a time
+    # e.g. {"name": <name>, "abbrev": <abbrev>, "desc": <description>}
+    # All random draws are from 'rng', e.g. random.Random(<seed>) to always
+    # generate the same products
+    # 'stats' (if given) gets the stats of each, e.g. {"name_s": <time (s) to
+    # generate the name>, "desc_s": <for the description>, "attempts": ...}
+    # Descriptions are generated from the chain of 'mode' (see DESC_MODES)
+    # Names are generated NAME_BATCH at a time (see service_names())
+    descs = desc_model(m, mode)
+    names = []
+    for i in range(n):
         # Service name, abbreviation
-        name_str, abbrev_str = service_name(existing_names, tags_dict)
+        if not names:
+            batch = min(NAME_BATCH, n - i)
+            start = time.perf_counter()
+            names = service_names(m.name_grammar, batch, rng)[::-1]
+            name_s = (time.perf_counter() - start) / batch
+        name_str, abbrev_str = names.pop()
 
         # Tweet intro
         intro = toot_intro(name_str, abbrev_str)
@@ -474,18 +519,110 @@ def main(aws_json_file):
         desc_max_len = MAX_LEN - len(intro)
 
         # Service description
-        desc = service_desc(corpus, tags_dict, desc_max_len)
+        desc_stats = {}
+        start = time.perf_counter()
+        desc = service_desc(descs, m.start_verbs, desc_max_len, desc_stats, rng)
+        desc_s = time.perf_counter() - start
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(
+                f"Description took {desc_stats['attempts']} attempt(s), "
+                f"{desc_stats['steps']} step(s), "
+                f"rejections: {desc_stats['rejections']}"
+            )
+        if stats is not None:
+            stats.append({"name_s": name_s, "desc_s": desc_s, **desc_stats})
+
+        yield {"name": name_str, "abbrev": abbrev_str, "desc": desc}
+
+
+def generate_jsonl(
+    m: model.Model, n: int = 1, rng: random.Random = random, mode: str = "words"
+) -> Iterator[str]:
+    # Same as generate(), as JSON Lines
+    for product in generate(m, n, rng, mode=mode):
+        yield json.dumps(product, ensure_ascii=False) + "\n"
+
+
+def generate_post(
+    m: model.Model,
+    rng: random.Random = random,
+    history: Optional[dedupe.PostIndex] = None,
+    mode: str = "words",
+) -> Optional[Dict]:
+    # Generate a toot from a model, with the product it's of, e.g.
+    # {"text": <toot>, "name": <name>, "desc": <description>}
+    # None if it can't be posted (see compose()) or if its name or description
+    # is too similar to an existing product's, or to a past toot's in 'history'
+    # (if given). It's only added to 'history' once posted (see toot())
+    for product in generate(m, 1, rng, mode=mode):
+        text = compose(product)
+        if text is None:
+            return None
+        for against, index in [("source", m.sources), ("history", history)]:
+            if index is None:
+                continue
+            part = index.check(product["name"], product["desc"])
+            if part:
+                log.debug(f"Toot too similar to a {against} {part}: {text}")
+                metrics.DUPLICATES.inc(against=against, part=part)
+                return None
+        return {"text": text, "name": product["name"], "desc": product["desc"]}
+
+
+def toot(
+    m: model.Model,
+    rng: random.Random = random,
+    history: Optional[dedupe.PostIndex] = None,
+    mode: str = "words",
+) -> None:
+    # Generate and send a toot from a model (then added to 'history', if given)
+    post = generate_post(m, rng, history, mode)
+    if post is None:
+        log.warning("No toot generated")
+        return
+    send_toot(post["text"])
+    if history is not None:
+        history.add(post["name"], post["desc"])
 
-        # Tweet
-        send_toot(f"{intro} {desc}")
 
-    # import pprint
-    # pprint.pprint(tags_dict)
-    # pprint.pprint(existing_names)'
+def main(aws_json_file, model_file=None, n=None, seed=None, mode="words"):
+    # Load the model (prebuilt by model.py if given, built otherwise)
+    m = model.get_model(aws_json_file, model_file)
+
+    # Same seed, same products (for a given model)
+    rng = random.Random(seed) if seed is not None else random
+
+    if n is None:
+        toot(m, rng, mode=mode)
+        # Don't exit before it's sent
+        if not DISABLE_TOOT:
+            mastodon_poster.join()
+    else:
+        # Batch: only generate, as JSON Lines to stdout
+        for line in generate_jsonl(m, n, rng, mode):
+            sys.stdout.write(line)
 
 
 if __name__ == "__main__":
-    # Usage: toot.py <file.json>
-    filename = sys.argv[1]
+    # Usage: toot.py <file.json> [<file.model>] [-n <count>] [--seed <seed>]
+    #   [--mode words|pos]
+    parser = argparse.ArgumentParser()
+    parser.add_argument("filename", help="products JSON file (see get.py)")
+    parser.add_argument("model_file", nargs="?", help="prebuilt model (model.py)")
+    parser.add_argument(
+        "-n",
+        type=int,
+        help="generate <n> products as JSON Lines to stdout instead of tooting",
+    )
+    parser.add_argument(
+        "--seed", type=int, help="seed of the random draws, to reproduce a run"
+    )
+    parser.add_argument(
+        "--mode",
+        choices=DESC_MODES,
+        default="words",
+        help="chain to generate descriptions from (default: words)",
+    )
+    args = parser.parse_args()
 
-    main(filename)
+    main(args.filename, args.model_file, args.n, args.seed, args.mode)